@@ -0,0 +1,16 @@
+"""
+Benchmarks for the L-System pipeline.
+
+Run from the repository root: `python3 -m lsys.bench` runs the suite over
+every pipeline stage (see __main__.py), and modules such as
+`python3 -m lsys.bench.rewrite` compare one stage before and after a change.
+"""
+
+import sys
+from pathlib import Path
+
+# the modules package lives next to lsys_main.py, which is normally run as a
+# script; make it importable when the benchmarks are run with -m
+LSYS_DIR = Path(__file__).resolve().parent.parent
+if str(LSYS_DIR) not in sys.path:
+    sys.path.insert(0, str(LSYS_DIR))
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite covering every stage of the pipeline.
+
+Runs canonical workloads through each stage in turn: the README fern, the
+rule sets recorded in the Examples svgs, and synthetic explosive rules at
+several depths. The stages are expand (set_lsys_string), interpret
+(lsys_to_lines), merge (merge_continuous_lines), travel (optimise_travel),
+scale (scale_to_fit), and the line and compound path svg writers. Each stage
+is timed (best of --repeat, from fixed seeds) and run once more under
+tracemalloc for its peak memory. Results are printed as a table and can be
+written as JSON. Given a baseline JSON from an earlier run, stages more than
+--threshold slower (or larger) than the baseline are listed and the exit
+status is 1.
+
+Run from the repository root:
+
+    python3 -m lsys.bench --json bench.json
+    python3 -m lsys.bench --baseline bench.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from array import array
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import Any
+
+from lsys_main import line_elements, merge_continuous_lines, optimise_travel
+from modules import lsys, svg, utils
+from modules.segments import SegmentBuffer
+
+from .interpreter import EXTENDED, example_systems
+
+# the README fern, expanded without the length guard
+FERN = ("fern N=7", "X", {"X": "F+[[X]--X]-F[-FX]++X", "F": "FF"}, 7, 90.0, -20.0, 150.0)
+EXPLOSIVE = {"F": "F[+F]F[-F]F[+F-F]"}
+IMAGE_SIZE = (2970, 4200)
+BLEED = 200
+PRECISION = 0
+SEED = 1
+
+# stages slower than this are too noisy to flag as regressions
+MIN_SECONDS = 0.005
+# and peaks smaller than this (in MB)
+MIN_PEAK_MB = 1.0
+
+
+def workloads(explosive_depths: list[int], max_length: int) -> Iterator[tuple]:
+    """
+    yield (name, axiom, rules, n, initial angle, rotation, line length,
+    max_length) for each workload
+    """
+    yield (*FERN, None)
+    for name, *system in example_systems():
+        yield (f"example {name}", *system, max_length)
+    yield (*EXTENDED, max_length)
+    for depth in explosive_depths:
+        yield (f"explosive N={depth}", "F", EXPLOSIVE, depth, 90.0, 30.0, 150.0, max_length)
+
+
+def copy_of(lines: SegmentBuffer) -> Callable[[], SegmentBuffer]:
+    """return a setup function handing each run its own copy of lines"""
+    return lambda: SegmentBuffer(array("d", lines.data), precision=lines.precision, box=lines.box)
+
+
+def measure(stage: Callable[[Any], Any], setup: Callable[[], Any], repeat: int) -> tuple[float, float, Any]:
+    """
+    return the best wall time of repeat runs of stage(setup()), the peak
+    traced memory (MB) of one more run, and that run's result. setup is
+    neither timed nor traced, and the random seed is reset before each run
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        argument = setup()
+        random.seed(SEED)
+        start = time.perf_counter()
+        stage(argument)
+        best = min(best, time.perf_counter() - start)
+    argument = setup()
+    random.seed(SEED)
+    tracemalloc.start()
+    try:
+        result = stage(argument)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak / 1e6, result
+
+
+def write_svg(lines: SegmentBuffer, directory: str, compound_paths: bool) -> int:
+    """write lines as the pipeline does, returning the bytes written"""
+    area = (0, 0, *IMAGE_SIZE)
+    with svg.SvgWriter(Path(directory) / "bench.svg", IMAGE_SIZE, area, comment={"TITLE": "BENCH"}) as doc:
+        with doc.group({"fill": "none", "stroke": "#000", "stroke-width": 5}):
+            doc.write_all(line_elements(lines, compound_paths, PRECISION))
+    return doc.size
+
+
+def run_workload(system: tuple, repeat: int, directory: str) -> dict[str, dict[str, float]]:
+    """run one workload through every stage, returning {stage: measurements}"""
+    _, axiom, rules, n, initial_angle, rotation, length, max_length = system
+    results = {}
+
+    def record(name, stage, setup, count):
+        seconds, peak_mb, result = measure(stage, setup, repeat)
+        results[name] = {"seconds": seconds, "peak_mb": peak_mb, "items": count(result)}
+        return result
+
+    tree = record("expand", lambda _: lsys.set_lsys_string(axiom, rules, n, max_length), lambda: None, len)
+    lines = record("interpret", lambda tree: lsys.lsys_to_lines(tree, initial_angle, length, rotation), lambda: tree, len)
+
+    # the clean up generate_and_save_svg does before merging
+    lines.round(PRECISION)
+    lines.normalise()
+    lines.dedupe()
+    merged = record("merge", lambda lines: lines.derive(merge_continuous_lines(lines, PRECISION)), copy_of(lines), len)
+    record("travel", optimise_travel, copy_of(merged), len)
+    scaled = record("scale", lambda lines: svg.scale_to_fit(lines, IMAGE_SIZE, BLEED, PRECISION), copy_of(merged), len)
+    record("svg lines", lambda lines: write_svg(lines, directory, False), lambda: scaled, int)
+    record("svg paths", lambda lines: write_svg(lines, directory, True), lambda: scaled, int)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """list the stages slower or larger than the baseline by more than threshold"""
+    regressions = []
+    for workload, stages in results.items():
+        for stage, now in stages.items():
+            before = baseline.get(workload, {}).get(stage)
+            if before is None:
+                continue
+            if now["seconds"] >= MIN_SECONDS and now["seconds"] > before["seconds"] * (1 + threshold):
+                regressions.append(
+                    f"{workload} / {stage}: {before['seconds']:.4f}s -> {now['seconds']:.4f}s "
+                    f"({now['seconds'] / before['seconds']:.2f}x)"
+                )
+            if now["peak_mb"] >= MIN_PEAK_MB and now["peak_mb"] > before["peak_mb"] * (1 + threshold):
+                regressions.append(
+                    f"{workload} / {stage}: peak {before['peak_mb']:.1f}MB -> {now['peak_mb']:.1f}MB "
+                    f"({now['peak_mb'] / before['peak_mb']:.2f}x)"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-length", type=int, default=100000, help="length guard for expanding, as in a normal run")
+    parser.add_argument("--explosive-depths", type=int, nargs="+", default=[3, 4, 5])
+    parser.add_argument("--only", type=str, help="only run workloads whose name contains this")
+    parser.add_argument("--json", type=str, help="write the results to this file")
+    parser.add_argument("--baseline", type=str, help="compare against results written by an earlier --json run")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown over the baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    print(f"{'workload':<32}{'stage':<11}{'items':>10}{'seconds':>10}{'peak MB':>9}")
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for system in workloads(args.explosive_depths, args.max_length):
+            name = system[0]
+            if args.only and args.only not in name:
+                continue
+            # the stages print progress and sizes; keep the table readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[name] = run_workload(system, args.repeat, directory)
+            for stage, measured in results[name].items():
+                print(f"{name[:31]:<32}{stage:<11}{measured['items']:>10}{measured['seconds']:>10.4f}{measured['peak_mb']:>9.2f}")
+
+    if args.json:
+        report = {
+            "created": utils.date_string(),
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+            "repeat": args.repeat,
+            "max_length": args.max_length,
+            "results": results,
+        }
+        Path(args.json).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"Wrote {args.json}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regressions over {args.baseline} (threshold {args.threshold:.0%}):")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regressions over {args.baseline} (threshold {args.threshold:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the python and numpy turtle interpreters.
+
+Interprets the README fern at increasing recursion depths with
+lsys.lsys_to_lines and lsys_numpy.lsys_to_segments, reporting the time
+taken and the number of unique segments each produced.
+"""
+
+import argparse
+import time
+
+from modules import lsys, lsys_numpy
+
+FERN = {"X": "F+[[X]--X]-F[-FX]++X", "F": "FF"}
+FERN_ARGS = (90, 150, -20)
+
+
+def best_time(func, *args, repeat=3):
+    """return the best wall time of repeat calls and the last result"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--depths", type=int, nargs="+", default=[6, 7, 8, 9, 10])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if not lsys_numpy.available():
+        raise SystemExit("NumPy is not installed, nothing to compare")
+
+    print(f"{'N':>4}{'symbols':>12}{'segments':>10}{'python (s)':>12}{'numpy (s)':>12}{'speedup':>10}")
+    for depth in args.depths:
+        tree = lsys.set_lsys_string("X", FERN, depth, max_length=10**9)
+        py_time, lines = best_time(lsys.lsys_to_lines, tree, *FERN_ARGS, repeat=args.repeat)
+        np_time, segments = best_time(lsys_numpy.lsys_to_segments, tree, *FERN_ARGS, repeat=args.repeat)
+        speedup = py_time / np_time if np_time else float("inf")
+        print(f"{depth:>4}{len(tree):>12}{len(lines):>10}{py_time:>12.4f}{np_time:>12.4f}{speedup:>9.1f}x")
+        if len(segments) > len(lines):
+            print(f"     numpy produced {len(segments) - len(lines)} more segments than python")
+
+
+if __name__ == "__main__":
+    main()
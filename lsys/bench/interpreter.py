@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Before/after benchmark for lsys_to_lines' run-folding interpreter.
+
+Interprets the rule sets recorded in the Examples svgs, plus one using the
+extended instruction set and G, with the original symbol-by-symbol interpreter
+and the run-folding one, reporting how far runs fold the instruction
+stream. Each system is run with its own (quantised) rotation and with the
+rotation nudged off the heading table, so both heading paths are covered.
+The original takes cos/sin of every heading, and folded runs of float
+updates can differ from repeated ones in the last bits, so segments must
+match to within rounding.
+"""
+
+import argparse
+import ast
+import time
+from itertools import chain, product
+from math import cos, radians, sin
+from operator import add
+from pathlib import Path
+
+from modules import lsys, read
+
+EXAMPLES = Path(__file__).resolve().parent.parent.parent / "Examples"
+# G draws like F, but runs of F and G must stay separate segments
+EXTENDED = ("extended", "X", {"X": "++fX>>(F[&--X##]XG<<))++", "F": "FfG", "G": "GF"}, 8, 90.0, 30.0, 150.0)
+
+
+def legacy_lsys_to_lines(
+    lsys: str,
+    angle: float,
+    length: float,
+    angle_offset: float,
+    weight: float = 1.0,
+    scale: float = 1.2,
+    angle_increment: float = 15.0,
+    weight_increment: float = 1.0
+) -> set[tuple[tuple[float, float], tuple[float, float], float]]:
+    """lsys_to_lines as it was originally, copied unchanged: one if/elif test per symbol, cos/sin per move"""
+    lines = []
+    stack = []
+    x, y = 0.0, 0.0
+    rotation_direction = 1
+
+    i = 0
+    while i < len(lsys):
+        c = lsys[i]
+        if c in ("F", "G"):
+            count = 1
+            while i + count < len(lsys) and lsys[i + count] == c:
+                count += 1
+            x2 = x - length * count * cos(radians(angle))
+            y2 = y - length * count * sin(radians(angle))
+            lines.append(((x, y), (x2, y2), weight))
+            x, y = x2, y2
+            i += count - 1
+        elif c == "f":
+            x2 = x - length * cos(radians(angle))
+            y2 = y - length * sin(radians(angle))
+            x, y = x2, y2
+        elif c == "+":
+            angle += angle_offset * rotation_direction
+        elif c == "-":
+            angle += angle_offset * -rotation_direction
+        elif c == "|":
+            angle += 180
+        elif c == "[":
+            stack.append((x, y, angle, angle_offset, length, weight, rotation_direction))
+        elif c == "]":
+            if stack:
+                x, y, angle, angle_offset, length, weight, rotation_direction = stack.pop()
+        elif c == "#":
+            weight += weight_increment
+        elif c == "!":
+            weight -= weight_increment
+        elif c == ">":
+            length *= scale
+        elif c == "<":
+            length /= scale
+        elif c == "&":
+            rotation_direction = -rotation_direction
+        elif c == "(":
+            angle_offset += angle_increment
+        elif c == ")":
+            angle_offset -= angle_increment
+        i += 1
+
+    return set(lines)
+
+
+def example_systems():
+    """yield (name, axiom, rules, n, initial angle, rotation, line length) for each example svg"""
+    for path in sorted(EXAMPLES.glob("*.svg")):
+        params = read.parse_comment(read.extract_comment(path))
+        if "RULES" not in params:
+            continue
+        # svg comments can't hold "--", so it is written as "- -"
+        rules = ast.literal_eval(params["RULES"].replace("- -", "--"))
+        yield (
+            path.stem[:20],
+            params["AXIOM"],
+            rules,
+            int(params["N"]),
+            float(params["INITIAL_ANGLE"]),
+            float(params["ROTATE_ANGLE"]),
+            float(params["LINE_LENGTH"]),
+        )
+
+
+def segment_set(lines, quantum):
+    """the segments of a buffer or set of lines as a set, snapped to multiples of quantum"""
+    return {
+        (*(round(value / quantum) for value in (*start, *end)), weight)
+        for start, end, weight in lines
+    }
+
+
+def same_segments(result, expected):
+    """
+    True if both hold the same segments, to within float rounding of the
+    largest coordinate. Segments are snapped to a grid, and one that lands
+    in a different cell from its match must be in a neighbouring one
+    """
+    largest = max((abs(value) for start, end, _ in chain(result, expected) for value in (*start, *end)), default=0.0)
+    quantum = max(largest, 1.0) * 1e-9
+    result, expected = segment_set(result, quantum), segment_set(expected, quantum)
+
+    def near(key, keys):
+        *values, weight = key
+        return any((*map(add, values, offset), weight) in keys for offset in product((-1, 0, 1), repeat=4))
+
+    return all(near(key, expected) for key in result - expected) and all(near(key, result) for key in expected - result)
+
+
+def best_time(func, *args, repeat=3):
+    """return the best wall time of repeat calls and the last result"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--max-length", type=int, default=2_000_000, help="length cap for expanding each example")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        f"{'system':<22}{'headings':>9}{'symbols':>10}{'ops':>9}{'folded':>8}{'segments':>10}"
+        f"{'before (s)':>12}{'after (s)':>11}{'speedup':>9}"
+    )
+    total_before = total_after = 0.0
+    for name, axiom, rules, n, initial_angle, rotation, length in chain(example_systems(), [EXTENDED]):
+        tree = lsys.set_lsys_string(axiom, rules, n, max_length=args.max_length)
+        for headings, offset in (("table", rotation), ("float", rotation + 1e-3)):
+            turtle_args = (tree, initial_angle, length, offset)
+            before, expected = best_time(legacy_lsys_to_lines, *turtle_args, repeat=args.repeat)
+            after, result = best_time(lsys.lsys_to_lines, *turtle_args, repeat=args.repeat)
+            assert same_segments(result, expected), f"{name} ({headings}): segments differ from legacy interpreter"
+            stats = {}
+            lsys.lsys_to_lines(*turtle_args, stats=stats)
+            total_before += before
+            total_after += after
+            speedup = before / after if after else float("inf")
+            folded = stats["symbols"] / stats["operations"]
+            print(
+                f"{name:<22}{headings:>9}{stats['symbols']:>10}{stats['operations']:>9}{folded:>7.2f}x{len(result):>10}"
+                f"{before:>12.4f}{after:>11.4f}{speedup:>8.2f}x"
+            )
+    print(f"{'total':<68}{total_before:>12.4f}{total_after:>11.4f}{total_before / total_after:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Before/after benchmark for set_lsys_string's rewriting engine.
+
+Compares the original character-by-character concatenation against the
+placeholder/str.replace engine at increasing recursion depths, and checks that both
+produce identical strings for a fixed seed.
+"""
+
+import argparse
+import random
+import time
+
+from modules import lsys
+
+FERN = {"X": "F+[[X]--X]-F[-FX]++X", "F": "FF"}
+STOCHASTIC = {
+    "F": ["F[+F]F[-F]F", "F[+F]F", "F[-F]F"],
+    "x": "F-[[x]+x]+F[+Fx]-x",
+}
+
+
+def legacy_rewrite(axiom, rules, n, max_length=100000):
+    """the original implementation of set_lsys_string, kept for comparison"""
+    string = axiom
+    for _ in range(n):
+        if len(string) > (max_length // 10):
+            break
+        next_string = ""
+        for c in string:
+            replacement = rules.get(c, c)
+            if isinstance(replacement, list):
+                next_string += random.choice(replacement)
+            else:
+                next_string += replacement
+        string = next_string
+        if len(string) >= max_length:
+            break
+    return string
+
+
+def time_call(func, *args, seed=1, repeat=3):
+    """return the best wall time of repeat calls and the last result"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        random.seed(seed)
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--depths", type=int, nargs="+", default=[4, 6, 8, 10, 12, 13])
+    parser.add_argument("--max-length", type=int, default=10_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'system':<12}{'N':>4}{'length':>12}{'before (s)':>14}{'after (s)':>12}{'speedup':>10}")
+    for name, axiom, rules in (("fern", "X", FERN), ("stochastic", "Fx", STOCHASTIC)):
+        for depth in args.depths:
+            before, expected = time_call(legacy_rewrite, axiom, rules, depth, args.max_length, repeat=args.repeat)
+            after, result = time_call(
+                lambda *a: lsys.set_lsys_string(*a), axiom, rules, depth, args.max_length, repeat=args.repeat
+            )
+            assert result == expected, f"{name} N={depth}: output differs from legacy engine"
+            speedup = before / after if after else float("inf")
+            print(f"{name:<12}{depth:>4}{len(result):>12}{before:>14.4f}{after:>12.4f}{speedup:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
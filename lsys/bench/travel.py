@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of optimise_travel's greedy tour.
+
+Times the spatial-hash tour on random short segments at increasing sizes,
+and at the smaller sizes compares it with the original full-scan tour,
+reporting the pen-up distance of each.
+"""
+
+import argparse
+import random
+import time
+
+from lsys_main import optimise_travel
+from modules import travel
+
+
+def legacy_optimise_travel(lines):
+    """the original optimise_travel, scanning every unvisited line for the nearest"""
+    if not lines:
+        return []
+    point_to_lines = {}
+    for i, line in enumerate(lines):
+        point_to_lines.setdefault(line[0], set()).add(i)
+        point_to_lines.setdefault(line[1], set()).add(i)
+    unvisited = set(range(len(lines)))
+    optimized = []
+    current_pt = lines[0][0]
+    while unvisited:
+        next_line_idx = None
+        if current_pt in point_to_lines:
+            for idx in point_to_lines[current_pt]:
+                if idx in unvisited:
+                    next_line_idx = idx
+                    break
+        if next_line_idx is None:
+            min_dist_sq = float("inf")
+            for i in unvisited:
+                l = lines[i]
+                d1 = (l[0][0] - current_pt[0]) ** 2 + (l[0][1] - current_pt[1]) ** 2
+                if d1 < min_dist_sq:
+                    min_dist_sq, next_line_idx = d1, i
+                d2 = (l[1][0] - current_pt[0]) ** 2 + (l[1][1] - current_pt[1]) ** 2
+                if d2 < min_dist_sq:
+                    min_dist_sq, next_line_idx = d2, i
+        l = lines[next_line_idx]
+        unvisited.remove(next_line_idx)
+        d1 = (l[0][0] - current_pt[0]) ** 2 + (l[0][1] - current_pt[1]) ** 2
+        d2 = (l[1][0] - current_pt[0]) ** 2 + (l[1][1] - current_pt[1]) ** 2
+        if d1 <= d2:
+            optimized.append((l[0], l[1], l[2]))
+            current_pt = l[1]
+        else:
+            optimized.append((l[1], l[0], l[2]))
+            current_pt = l[0]
+    return optimized
+
+
+def random_segments(count, size=10000, max_length=50, seed=1):
+    """return count short segments on a size x size integer grid"""
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        x, y = rng.randint(0, size), rng.randint(0, size)
+        lines.append(((x, y), (x + rng.randint(-max_length, max_length), y + rng.randint(-max_length, max_length)), 5))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--legacy-limit", type=int, default=10_000, help="largest size to run the full-scan tour on")
+    args = parser.parse_args()
+
+    print(f"{'segments':>10}{'grid (s)':>10}{'pen-up':>14}{'scan (s)':>10}{'pen-up':>14}")
+    for size in args.sizes:
+        lines = random_segments(size)
+        start = time.perf_counter()
+        tour = optimise_travel(lines)
+        grid_time = time.perf_counter() - start
+        row = f"{size:>10}{grid_time:>10.2f}{travel.pen_up_distance(tour):>14.0f}"
+        if size <= args.legacy_limit:
+            start = time.perf_counter()
+            legacy = legacy_optimise_travel(lines)
+            row += f"{time.perf_counter() - start:>10.2f}{travel.pen_up_distance(legacy):>14.0f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,12 @@
 Skeleton file for new scripts
 """
 
+import atexit
+import contextlib
+import cProfile
+import logging
+import os
+import pstats
 import random
 import sys
 import time
@@ -12,54 +18,21 @@ from pathlib import Path
 from typing import Any
 
 # local libraries from the helpers directory
-from modules import cli, lsys, read, svg, utils, variant
+from modules import batch, cache, cli, collinear, log, lsys, lsys_numpy, profiler, raster, read, svg, travel, utils, variant
+from modules.log import LOGGER
+from modules.segments import SegmentBuffer
 
 
-def merge_continuous_lines(lines):
-    merged = True
-    while merged:
-        merged = False
-        lines.sort(key=lambda x: (x[0], x[1]))
-        
-        starts_at = {}
-        for i, (a, b, w) in enumerate(lines):
-            starts_at.setdefault(a, []).append((b, w, i))
-            
-        to_remove = set()
-        new_lines = []
-        
-        for i, (a, b, w) in enumerate(lines):
-            if i in to_remove:
-                continue
-                
-            merged_this = False
-            if b in starts_at:
-                for b2, w2, j in starts_at[b]:
-                    if j in to_remove or i == j:
-                        continue
-                    if w == w2:
-                        dx1 = b[0] - a[0]
-                        dy1 = b[1] - a[1]
-                        dx2 = b2[0] - b[0]
-                        dy2 = b2[1] - b[1]
-                        
-                        if abs(dx1 * dy2 - dy1 * dx2) < 1e-6:
-                            new_lines.append((a, b2, w))
-                            to_remove.add(i)
-                            to_remove.add(j)
-                            merged = True
-                            merged_this = True
-                            break
-            if not merged_this:
-                new_lines.append((a, b, w))
-                
-        lines = new_lines
-
-    return list(set(lines))
+def merge_continuous_lines(lines, precision=0):
+    # one sweep per supporting line merges touching, overlapping and
+    # reversed collinear segments alike
+    return collinear.merge_collinear(lines, precision)
+
 
 def optimise_travel(lines):
     if not lines:
         return []
+    lines = list(lines)
         
     point_to_lines = {}
     for i, line in enumerate(lines):
@@ -68,40 +41,27 @@ def optimise_travel(lines):
         point_to_lines.setdefault(pt1, set()).add(i)
         point_to_lines.setdefault(pt2, set()).add(i)
         
-    unvisited = set(range(len(lines)))
+    # nearest-neighbour lookups go through a grid over the end points rather
+    # than a scan of every unvisited line
+    index = travel.SpatialHash(lines)
     optimized = []
     
     current_pt = lines[0][0]
     
-    while unvisited:
+    while index.remaining:
         next_line_idx = None
         if current_pt in point_to_lines:
             for idx in point_to_lines[current_pt]:
-                if idx in unvisited:
+                if index.live[idx]:
                     next_line_idx = idx
                     break
                     
         if next_line_idx is None:
-            min_dist_sq = float('inf')
-            best_idx = None
-            
-            for i in unvisited:
-                l = lines[i]
-                d1 = (l[0][0] - current_pt[0])**2 + (l[0][1] - current_pt[1])**2
-                if d1 < min_dist_sq:
-                    min_dist_sq = d1
-                    best_idx = i
-                
-                d2 = (l[1][0] - current_pt[0])**2 + (l[1][1] - current_pt[1])**2
-                if d2 < min_dist_sq:
-                    min_dist_sq = d2
-                    best_idx = i
-                    
-            next_line_idx = best_idx
+            next_line_idx = index.nearest(current_pt)
             
         assert next_line_idx is not None
         l = lines[next_line_idx]
-        unvisited.remove(next_line_idx)
+        index.discard(next_line_idx)
         
         d1 = (l[0][0] - current_pt[0])**2 + (l[0][1] - current_pt[1])**2
         d2 = (l[1][0] - current_pt[0])**2 + (l[1][1] - current_pt[1])**2
@@ -116,89 +76,251 @@ def optimise_travel(lines):
     return optimized
 
 
-def generate_and_save_svg(PARAM_DICT, tree, lines, DEFAULT, args, base_dir):
-    svg_list = []
-    # apply precision, sort points to handle backwards lines, and remove duplicates
-    processed_lines = []
-    for line in lines:
-        pts = sorted(
-            [
-                (
-                    utils.set_precision(line[0][0], DEFAULT["PRECISION"]),
-                    utils.set_precision(line[0][1], DEFAULT["PRECISION"]),
-                ),
-                (
-                    utils.set_precision(line[1][0], DEFAULT["PRECISION"]),
-                    utils.set_precision(line[1][1], DEFAULT["PRECISION"]),
-                ),
-            ]
+# stage timers, enabled by --profile
+PROFILER = profiler.Profiler()
+
+
+def expand_tree(PARAM_DICT, DEFAULT):
+    """expand the axiom to a string, or to a lazy stream of chunks when STREAM is set"""
+    with PROFILER.stage("expand"):
+        tree = _expand_tree(PARAM_DICT, DEFAULT)
+    if isinstance(tree, str):
+        PROFILER.count("string length", len(tree))
+    return tree
+
+
+def _expand_tree(PARAM_DICT, DEFAULT):
+    # deterministic rules can be sized before anything is expanded
+    predicted = lsys.predict_lengths(PARAM_DICT["AXIOM"], PARAM_DICT["RULES"], PARAM_DICT["N"])
+    if predicted is not None:
+        depth = PARAM_DICT["N"]
+        guard = max_length(PARAM_DICT)
+        if guard is not None and not DEFAULT.get("STREAM", False):
+            # the max_length guard can stop expanding short of N
+            depth, _ = lsys.guard_depth(predicted, guard)
+        length, segments = predicted[depth]
+        LOGGER.info("Predicted at N=%d: %s symbols, up to %s segments", depth, f"{length:,}", f"{segments:,}")
+    if DEFAULT.get("STREAM", False):
+        return lsys.iter_lsys_string(PARAM_DICT["AXIOM"], PARAM_DICT["RULES"], PARAM_DICT["N"])
+    return lsys.set_lsys_string(PARAM_DICT["AXIOM"], PARAM_DICT["RULES"], PARAM_DICT["N"], max_length(PARAM_DICT))
+
+
+def max_length(PARAM_DICT):
+    # a budget has already sized N, so it replaces the max_length guard
+    return None if "BUDGET" in PARAM_DICT else 100000
+
+
+def apply_budget(PARAM_DICT, DEFAULT):
+    """
+    lower PARAM_DICT["N"] to the deepest generation that fits the MAX_SEGMENTS,
+    MAX_MEMORY_MB and MAX_SECONDS budgets, predicted from the rules before
+    expanding. the budget is recorded as a BUDGET entry of command line
+    flags, so --read reproduces the same depth
+    """
+    budget = {
+        "--max-segments": DEFAULT.get("MAX_SEGMENTS", 0),
+        "--max-memory-mb": DEFAULT.get("MAX_MEMORY_MB", 0),
+        "--max-seconds": DEFAULT.get("MAX_SECONDS", 0),
+    }
+    PARAM_DICT.pop("BUDGET", None)
+    if not any(budget.values()):
+        return
+    requested = PARAM_DICT["N"]
+    PARAM_DICT["N"] = lsys.choose_depth(
+        PARAM_DICT["AXIOM"],
+        PARAM_DICT["RULES"],
+        requested,
+        max_segments=budget["--max-segments"],
+        max_bytes=int(budget["--max-memory-mb"] * 1e6),
+        max_seconds=budget["--max-seconds"],
+    )
+    PARAM_DICT["BUDGET"] = " ".join(f"{flag} {value}" for flag, value in budget.items() if value)
+    LOGGER.info("Budget %s: N=%d (requested %d)", PARAM_DICT["BUDGET"], PARAM_DICT["N"], requested)
+
+
+def tree_to_lines(tree, PARAM_DICT, DEFAULT, args):
+    """interpret an expanded tree (string or chunk stream) as turtle lines"""
+    turtle_args = (
+        tree,
+        PARAM_DICT["INITIAL_ANGLE"],
+        PARAM_DICT["LINE_LENGTH"],
+        PARAM_DICT["ROTATE_ANGLE"],
+    )
+    turtle_kwargs = {
+        "weight": DEFAULT.get("LINE_STYLE", {}).get("stroke-width", 10),
+        "scale": args.scale,
+        "angle_increment": args.angle_increment,
+        "weight_increment": args.weight_increment,
+    }
+    if DEFAULT.get("BACKEND", "python") == "numpy":
+        if lsys_numpy.available():
+            with PROFILER.stage("interpret"):
+                segments = lsys_numpy.lsys_to_segments(*turtle_args, **turtle_kwargs)
+            return SegmentBuffer.from_array(segments)
+        LOGGER.warning("NumPy is not installed, falling back to the python backend")
+    stats = {}
+    # a streamed tree is expanded as it is interpreted, so this stage covers both
+    with PROFILER.stage("interpret"):
+        lines = lsys.lsys_to_lines(*turtle_args, **turtle_kwargs, stats=stats)
+    PROFILER.count("string length", stats["symbols"])
+    PROFILER.count("raw segments", stats["segments"])
+    if stats["operations"]:
+        LOGGER.info(
+            "Instruction stream: %s symbols folded to %s operations (%.1fx)",
+            f"{stats['symbols']:,}", f"{stats['operations']:,}", stats["symbols"] / stats["operations"],
+        )
+    return lines
+
+
+# on-disk cache for expanded strings and segments, set up by open_cache
+CACHE = None
+
+
+def open_cache(DEFAULT, base_dir):
+    global CACHE
+    if DEFAULT.get("CACHE", False):
+        CACHE = cache.Cache(base_dir / DEFAULT["CACHE_DIR"], int(DEFAULT.get("CACHE_MAX_MB", 512) * 1e6))
+    return CACHE
+
+
+def report_cache():
+    # the report scans the cache directory, so skip it when it won't be logged
+    if LOGGER.isEnabledFor(logging.INFO):
+        LOGGER.info("%s", CACHE.report())
+
+
+def expand_and_draw(PARAM_DICT, DEFAULT, args, tree=None):
+    """
+    expand PARAM_DICT (unless a literal tree is given) and interpret it as
+    lines, reusing cached strings and segments where the inputs match.
+    Stochastic rules are only cached when a seed is pinned, keyed by the
+    random state they start from, and a hit restores the state they leave.
+    returns (tree, lines); tree is None when the segments came from the cache
+    """
+    if tree is None:
+        apply_budget(PARAM_DICT, DEFAULT)
+    if CACHE is None:
+        if tree is None:
+            tree = expand_tree(PARAM_DICT, DEFAULT)
+        return tree, tree_to_lines(tree, PARAM_DICT, DEFAULT, args)
+
+    stream = DEFAULT.get("STREAM", False)
+    stochastic = False
+    if tree is not None:
+        tree_key = CACHE.key("literal", tree)
+    else:
+        stochastic = any(isinstance(rule, list) for rule in PARAM_DICT["RULES"].values())
+        if stochastic and DEFAULT.get("SEED") is None:
+            tree = expand_tree(PARAM_DICT, DEFAULT)
+            return tree, tree_to_lines(tree, PARAM_DICT, DEFAULT, args)
+        tree_key = CACHE.key(
+            "tree", PARAM_DICT["AXIOM"], PARAM_DICT["RULES"], PARAM_DICT["N"], stream,
+            None if stream else max_length(PARAM_DICT), random.getstate() if stochastic else None,
         )
-        processed_lines.append((pts[0], pts[1], line[2]))
-    unique_lines = list(set(processed_lines))
+    lines_key = CACHE.key(
+        "lines", tree_key, PARAM_DICT["INITIAL_ANGLE"], PARAM_DICT["LINE_LENGTH"], PARAM_DICT["ROTATE_ANGLE"],
+        DEFAULT.get("LINE_STYLE", {}).get("stroke-width", 10), args.scale, args.angle_increment,
+        args.weight_increment, DEFAULT.get("BACKEND", "python"),
+    )
+
+    def restore(key, hit):
+        # a stochastic hit is only usable with the random state it left behind
+        if hit is None or not stochastic:
+            return hit
+        state = CACHE.get_state(key)
+        if state is None:
+            return None
+        random.setstate(state)
+        return hit
+
+    lines = restore(lines_key, CACHE.get_segments(lines_key))
+    if lines is not None:
+        return tree, lines
+
+    if tree is None and not stream:
+        tree = restore(tree_key, CACHE.get_string(tree_key))
+        if tree is None:
+            tree = expand_tree(PARAM_DICT, DEFAULT)
+            CACHE.put_string(tree_key, tree)
+            if stochastic:
+                CACHE.put_state(tree_key, random.getstate())
+    elif tree is None:
+        tree = expand_tree(PARAM_DICT, DEFAULT)
+    lines = tree_to_lines(tree, PARAM_DICT, DEFAULT, args)
+    if not isinstance(lines, SegmentBuffer):
+        lines = SegmentBuffer.from_lines(lines)
+    CACHE.put_segments(lines_key, lines)
+    if stochastic:
+        CACHE.put_state(lines_key, random.getstate())
+    return tree, lines
+
+
+def line_chains(lines):
+    # yield runs of points for lines that meet end to start
+    ordered = iter(lines)
+    first = next(ordered, None)
+    if first is None:
+        return
+    current_path = [first[0], first[1]]
+    for line in ordered:
+        if line[0] == current_path[-1]:
+            current_path.append(line[1])
+        else:
+            yield current_path
+            current_path = [line[0], line[1]]
+    yield current_path
+
+
+def line_elements(lines, compound_paths=False, precision=0):
+    # yield svg elements for a group of lines, as compound paths if requested
+    if compound_paths:
+        return svg.paths(line_chains(lines), precision)
+    return svg.lines(lines, precision)
+
+
+def save_png(lines, DEFAULT, svg_filepath):
+    # rasterise the scaled lines to a greyscale PNG_WIDTH preview beside the svg
+    background = DEFAULT.get("BACKGROUND_COLOR", "white")
+    paper = raster.grey(background, 255)
+    ink = raster.grey(DEFAULT.get("LINE_STYLE", {}).get("stroke", "#000"), 0)
+    width, height, pixels = raster.rasterise(lines, DEFAULT["IMAGE_SIZE"], DEFAULT["PNG_WIDTH"], paper, ink)
+    png_filepath = Path(svg_filepath).with_suffix(".png")
+    size = raster.write_png(png_filepath, width, height, pixels, transparent=paper if background == "none" else None)
+    PROFILER.count("png bytes", size)
+    LOGGER.info("Wrote %dx%d preview (%d bytes) to %s", width, height, size, png_filepath)
+
+
+def generate_and_save_svg(PARAM_DICT, tree, lines, DEFAULT, args, base_dir, name_suffix=""):
+    if not isinstance(lines, SegmentBuffer):
+        lines = SegmentBuffer.from_lines(lines)
+    # apply precision, sort points to handle backwards lines, and remove duplicates
+    # (all in place on the segment buffer)
+    with PROFILER.stage("dedupe"):
+        lines.round(DEFAULT["PRECISION"])
+        lines.normalise()
+        lines.dedupe()
+    PROFILER.count("unique segments", len(lines))
+
+    # clip collinear lines that overlap, so each stretch of ink is drawn once
+    with PROFILER.stage("clip"):
+        clipped, redundant = collinear.clip_overlaps(lines, DEFAULT["PRECISION"])
+    if redundant:
+        lines = lines.derive(clipped)
+        LOGGER.info("Removed %.0f units of overlapping stroke length", redundant)
+    PROFILER.count("clipped segments", len(lines))
     
     if DEFAULT.get("MERGE", False):
-        unique_lines = merge_continuous_lines(unique_lines)
+        with PROFILER.stage("merge"):
+            lines = lines.derive(merge_continuous_lines(lines, DEFAULT["PRECISION"]))
+        PROFILER.count("merged segments", len(lines))
 
-    if len(unique_lines) < 5:
+    if len(lines) < 5:
         # less than 5 lines, we should break
         sys.exit("Not enough lines to draw")
 
-    # scale and center the lines to fit exactly within IMAGE_SIZE
-    scaled_lines_raw = svg.scale_to_fit(
-        unique_lines, DEFAULT["IMAGE_SIZE"], DEFAULT["BLEED"]
-    )
-    scaled_lines = []
-    for line in scaled_lines_raw:
-        pts = [
-            (
-                utils.set_precision(line[0][0], DEFAULT["PRECISION"]),
-                utils.set_precision(line[0][1], DEFAULT["PRECISION"]),
-            ),
-            (
-                utils.set_precision(line[1][0], DEFAULT["PRECISION"]),
-                utils.set_precision(line[1][1], DEFAULT["PRECISION"]),
-            ),
-        ]
-        scaled_lines.append((pts[0], pts[1], line[2]))
-
-    # group and draw the lines
-    groups = {}
-    for line in scaled_lines:
-        style = DEFAULT.get("LINE_STYLE", {}).copy()
-        if "fill" not in style:
-            style["fill"] = "none"
-        if line[2] is not None:
-            style["stroke-width"] = line[2]
-        
-        style_key = tuple(sorted(style.items()))
-        if style_key not in groups:
-            groups[style_key] = []
-        groups[style_key].append(line)
-
-    for style_key, lines in groups.items():
-        if DEFAULT.get("OPTIMISE_TRAVEL", False):
-            lines = optimise_travel(lines)
-            
-        style_dict = dict(style_key)
-        group_style = svg.dict_to_tags(style_dict)
-        group_tag = f"<g {group_style}>" if group_style else "<g>"
-        svg_list.append(group_tag)
-        
-        if DEFAULT.get("COMPOUND_PATHS", False) and lines:
-            current_path = [lines[0][0], lines[0][1]]
-            for line in lines[1:]:
-                if line[0] == current_path[-1]:
-                    current_path.append(line[1])
-                else:
-                    svg_list.append(svg.path(current_path))
-                    current_path = [line[0], line[1]]
-            if current_path:
-                svg_list.append(svg.path(current_path))
-        else:
-            for line in lines:
-                svg_list.append(svg.line(line[0], line[1]))
-                
-        svg_list.append("</g>")
+    # scale, center and round the lines to fit exactly within IMAGE_SIZE
+    with PROFILER.stage("scale"):
+        lines = svg.scale_to_fit(lines, DEFAULT["IMAGE_SIZE"], DEFAULT["BLEED"], DEFAULT["PRECISION"])
 
     # set the viewbox and paper size to the requested IMAGE_SIZE
     DEFAULT["PAPER_SIZE"] = DEFAULT["IMAGE_SIZE"]
@@ -208,17 +330,6 @@ def generate_and_save_svg(PARAM_DICT, tree, lines, DEFAULT, args, base_dir):
         DEFAULT["IMAGE_SIZE"][0],
         DEFAULT["IMAGE_SIZE"][1],
     )
-
-    svg_list.append(svg.set_comment(PARAM_DICT))
-    utils.print_params(DEFAULT)
-
-    # fill svg_list with svg objects
-    doc = svg.build_svg_file(
-        DEFAULT["PAPER_SIZE"],
-        DEFAULT["DRAWABLE_AREA"],
-        svg_list,
-        background=DEFAULT.get("BACKGROUND_COLOR", "white"),
-    )
     output_dir = base_dir / DEFAULT["OUTPUT_DIR"]
     
     filename_pref = DEFAULT.get("FILENAME")
@@ -235,22 +346,306 @@ def generate_and_save_svg(PARAM_DICT, tree, lines, DEFAULT, args, base_dir):
                 base_filename = lsys.generate_filename(parsed_string)
         else:
             base_filename = lsys.generate_filename(PARAM_DICT['RULES'])
-        
-    DEFAULT.update(
-        {
-            "OUTPUT_FILEPATH": str(
-                Path(utils.create_dir(output_dir)).resolve()
-                / f"{base_filename}.svg"
-            )
+    output_filepath = str(Path(utils.create_dir(output_dir)).resolve() / f"{base_filename}{name_suffix}.svg")
+
+    if DEFAULT.get("PNG_WIDTH", 0) > 0:
+        with PROFILER.stage("png"):
+            save_png(lines, DEFAULT, output_filepath)
+
+    # group and draw the lines, writing each group's elements straight to disk
+    style = DEFAULT.get("LINE_STYLE", {}).copy()
+    if "fill" not in style:
+        style["fill"] = "none"
+    groups = lines.group_by_weight()
+    segment_count = len(lines)
+    LOGGER.info("%s", lines.report())
+
+    with svg.SvgWriter(
+        output_filepath,
+        DEFAULT["PAPER_SIZE"],
+        DEFAULT["DRAWABLE_AREA"],
+        background=DEFAULT.get("BACKGROUND_COLOR", "white"),
+        comment=PARAM_DICT,
+    ) as doc:
+        for weight, lines in groups.items():
+            style["stroke-width"] = int(weight) if weight.is_integer() else weight
+            if DEFAULT.get("OPTIMISE_TRAVEL", False):
+                with PROFILER.stage("travel"):
+                    lines = optimise_travel(lines)
+                budget = DEFAULT.get("TRAVEL_BUDGET_SECONDS", 0)
+                if budget > 0:
+                    # share the refinement budget between the weight groups
+                    before = travel.pen_up_distance(lines)
+                    with PROFILER.stage("refine"):
+                        lines = travel.refine_tour(lines, budget / len(groups))
+                    after = travel.pen_up_distance(lines)
+                    LOGGER.info("Pen-up distance (stroke-width %s): %.0f -> %.0f", style["stroke-width"], before, after)
+
+            with PROFILER.stage("write"), doc.group(dict(sorted(style.items()))):
+                doc.write_all(line_elements(lines, DEFAULT.get("COMPOUND_PATHS", False), DEFAULT["PRECISION"]))
+
+        utils.print_params(DEFAULT)
+
+    LOGGER.info("Emitted %.1f bytes per segment", doc.size / segment_count)
+    PROFILER.count("output bytes", doc.size)
+    DEFAULT.update({"OUTPUT_FILEPATH": output_filepath})
+    utils.print_params(PARAM_DICT)
+    if isinstance(tree, str):
+        LOGGER.info("%d", len(tree) * PARAM_DICT["N"])
+
+
+def screen(PARAM_DICT, DEFAULT, args):
+    """
+    cheaply check random rules before expanding them in full, returning why
+    they would draw a degenerate, tiny or explosive system (or None)
+    """
+    # with a budget, N is sized from the rules, so the length guard is off
+    budgeted = any(DEFAULT.get(key, 0) for key in ("MAX_SEGMENTS", "MAX_MEMORY_MB", "MAX_SECONDS"))
+    return lsys.screen_rules(
+        PARAM_DICT["AXIOM"],
+        PARAM_DICT["RULES"],
+        PARAM_DICT["N"],
+        PARAM_DICT["INITIAL_ANGLE"],
+        PARAM_DICT["ROTATE_ANGLE"],
+        max_length=None if budgeted or DEFAULT.get("STREAM", False) else 100000,
+        scale=args.scale,
+        angle_increment=args.angle_increment,
+        weight_increment=args.weight_increment,
+    )
+
+
+def random_lsys(DEFAULT, args, ANGLE_DIVS, LINE_LENGTH, RECURSION_DEPTH):
+    # generate random rules until they draw at least 5 lines
+    TRY_COUNT = 0
+    while True:
+        TRY_COUNT += 1
+        axiom = lsys.set_axiom(random.choice(range(1, 5)))
+        PARADIGM = DEFAULT.get("PARADIGM", "geometric")
+        OPTIONS = DEFAULT.get("OPTIONS_PER_RULE", 3)
+        rules = lsys.create_rule_dict(
+            axiom, 15, paradigm=PARADIGM, options_per_rule=OPTIONS
+        )
+        divisor = random.choice(ANGLE_DIVS)
+        PARAM_DICT = {
+            "TITLE": "LSYS PARAMS",
+            "PARADIGM": PARADIGM,
+            "N": RECURSION_DEPTH,
+            "AXIOM": axiom,
+            "RULES": rules,
+            "INITIAL_ANGLE": args.initial_angle if args.initial_angle is not None else 90,
+            "ROTATE_ANGLE": args.rotation if args.rotation is not None else 360 / divisor,
+            "LINE_LENGTH": LINE_LENGTH,
+            "CREATED": utils.date_string(),
         }
+        if DEFAULT.get("SCREEN", True):
+            reason = screen(PARAM_DICT, DEFAULT, args)
+            if reason:
+                LOGGER.info(
+                    "%s %s, trying again (attempt %d)", rules, reason, TRY_COUNT,
+                    extra={"fields": {"attempt": TRY_COUNT, "rules": rules, "rejected": reason}},
+                )
+                continue
+        tree, lines = expand_and_draw(PARAM_DICT, DEFAULT, args)
+        if len(lines) >= 5:
+            return PARAM_DICT, tree, lines, TRY_COUNT
+        # the tree can run to megabytes; the logger truncates it
+        shown = tree if isinstance(tree, str) else PARAM_DICT["RULES"]
+        LOGGER.info(
+            "%s has %d lines, trying again (attempt %d)", shown, len(lines), TRY_COUNT,
+            extra={"fields": {"attempt": TRY_COUNT, "rules": PARAM_DICT["RULES"], "lines": len(lines)}},
+        )
+
+
+# config and arguments shared by every job in a worker process
+_WORKER = {}
+
+
+def init_worker(DEFAULT, args, base_dir):
+    _WORKER.update({"DEFAULT": DEFAULT, "args": args, "base_dir": base_dir})
+    open_cache(DEFAULT, base_dir)
+    # worker output is discarded, so only format what could matter
+    configure_logging(DEFAULT, quiet=True)
+    if DEFAULT.get("PROFILE", False):
+        PROFILER.start(DEFAULT.get("PROFILE_MEMORY", True))
+
+
+def render_job(row, generate, DEFAULT, name_suffix):
+    # run generate() for (PARAM_DICT, tree, lines, tries), then save the svg,
+    # timing both and keeping the worker's output off the terminal. cache
+    # counts and the job's profile are passed back for the parent to total
+    cache_stats = dict(CACHE.stats) if CACHE else {}
+    PROFILER.reset()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            start = time.perf_counter()
+            PARAM_DICT, tree, lines, tries = generate()
+            row.update({"segments": len(lines), "generate_seconds": time.perf_counter() - start})
+            if tries is not None:
+                row["tries"] = tries
+            start = time.perf_counter()
+            generate_and_save_svg(PARAM_DICT, tree, lines, DEFAULT, _WORKER["args"], _WORKER["base_dir"], name_suffix=name_suffix)
+            row["svg_seconds"] = time.perf_counter() - start
+        except (SystemExit, OSError) as exc:
+            # generate_and_save_svg exits when too few lines survive dedupe,
+            # and long rules can make a filename the OS rejects
+            row["error"] = str(exc)
+        finally:
+            if CACHE:
+                row["cache"] = {name: count - cache_stats[name] for name, count in CACHE.stats.items()}
+            if PROFILER.enabled:
+                row["profile"] = PROFILER.record()
+    if row.get("error"):
+        return row
+    row["file"] = DEFAULT["OUTPUT_FILEPATH"]
+    row["size"] = os.path.getsize(row["file"])
+    return row
+
+
+def batch_job(index, seed):
+    # generate and save one random drawing, seeded so the job can be rerun
+    DEFAULT = dict(_WORKER["DEFAULT"])
+    args = _WORKER["args"]
+    ANGLE_DIVS = DEFAULT.get("ANGLE_DIVISORS", [3, 4, 5, 6, 8, 10, 12])
+    LINE_LENGTH = DEFAULT.get("LINE_LENGTH", 150)
+    RECURSION_DEPTH = args.recursion if args.recursion is not None else DEFAULT["RECURSION_DEPTH"]
+    DEFAULT["SEED"] = seed
+    random.seed(seed)
+    return render_job(
+        {"job": index, "seed": seed},
+        lambda: random_lsys(DEFAULT, args, ANGLE_DIVS, LINE_LENGTH, RECURSION_DEPTH),
+        DEFAULT,
+        f"-{index:04d}",
     )
-    svg.write_file(DEFAULT["OUTPUT_FILEPATH"], doc)
-    utils.print_params(PARAM_DICT)
-    print(str(len(tree) * PARAM_DICT["N"]))
+
+
+def iterate_job(index, seed, PARAM_DICT, staging_dir):
+    # expand, draw and save one iteration into the staging directory
+    DEFAULT = dict(_WORKER["DEFAULT"])
+    DEFAULT["OUTPUT_DIR"] = staging_dir
+    DEFAULT["SEED"] = seed
+    random.seed(seed)
+
+    def generate():
+        return PARAM_DICT, *expand_and_draw(PARAM_DICT, DEFAULT, _WORKER["args"]), None
+
+    return render_job({"job": index, "seed": seed}, generate, DEFAULT, f"-{index:04d}")
+
+
+def run_batch(DEFAULT, args, base_dir):
+    # fan random drawings out across worker processes, printing a row per drawing
+    seed = args.seed if args.seed is not None else random.randrange(2**32)
+    LOGGER.info("Batch of %d drawings, seeds %d to %d", args.batch, seed, seed + args.batch - 1)
+    summary = batch.Summary()
+    batch.print_header()
+    start = time.perf_counter()
+    jobs = ((i, seed + i) for i in range(args.batch))
+    for row in batch.run(batch_job, jobs, args.workers, init_worker, (DEFAULT, args, base_dir)):
+        batch.print_row(row)
+        summary.add(row)
+        if CACHE:
+            CACHE.merge(row.get("cache"))
+        PROFILER.merge(row.get("profile"))
+    print(summary.report(time.perf_counter() - start))
+
+
+def run_iterate(DEFAULT, args, base_dir, base_params):
+    # mutate in the parent, where each iteration depends on the last, and
+    # expand, draw and save the iterations across worker processes. Workers
+    # write into a staging directory, and files are moved into OUTPUT_DIR
+    # in iteration order
+    constraints = DEFAULT.get("VARIANT_CONSTRAINTS", {})
+    iterate_only = constraints.get("ITERATED_PARAMETERS", ["rules", "N", "angles"])
+    output_dir = Path(utils.create_dir(base_dir / DEFAULT["OUTPUT_DIR"])).resolve()
+    staging_dir = output_dir / ".iterate"
+    staging_dir.mkdir(exist_ok=True)
+
+    # job seeds come from their own generator, so the mutation chain for a
+    # given --seed is the same as when iterations ran one by one
+    seeds = random.Random(args.seed)
+
+    def iterations(base_params):
+        for i in range(args.iterations):
+            base_params = variant.generate_variant(base_params, constraints, iterate_only)
+            PARAM_DICT = base_params.copy()
+            PARAM_DICT["TITLE"] = f"ITERATION {i+1}"
+            PARAM_DICT["N"] = int(PARAM_DICT["N"])
+            PARAM_DICT["INITIAL_ANGLE"] = float(PARAM_DICT["INITIAL_ANGLE"])
+            PARAM_DICT["ROTATE_ANGLE"] = float(PARAM_DICT["ROTATE_ANGLE"])
+            PARAM_DICT["LINE_LENGTH"] = float(PARAM_DICT["LINE_LENGTH"])
+            PARAM_DICT["CREATED"] = utils.date_string()
+            yield i + 1, seeds.randrange(2**32), PARAM_DICT, str(staging_dir)
+
+    summary = batch.Summary("Iterate")
+    batch.print_header()
+    start = time.perf_counter()
+    jobs = iterations(base_params)
+    for row in batch.run(iterate_job, jobs, args.workers, init_worker, (DEFAULT, args, base_dir), ordered=True):
+        if not row.get("error"):
+            staged = Path(row["file"])
+            row["file"] = str(output_dir / staged.name)
+            staged.replace(row["file"])
+            preview = staged.with_suffix(".png")
+            if preview.exists():
+                preview.replace(output_dir / preview.name)
+        batch.print_row(row)
+        summary.add(row)
+        if CACHE:
+            CACHE.merge(row.get("cache"))
+        PROFILER.merge(row.get("profile"))
+    print(summary.report(time.perf_counter() - start))
+    try:
+        staging_dir.rmdir()
+    except OSError:
+        pass
+
+
+def configure_logging(DEFAULT, quiet=False):
+    # quiet raises the level to warnings, as --quiet does
+    level = DEFAULT.get("LOG_LEVEL", "info")
+    if quiet and log.LEVELS.index(level) < log.LEVELS.index("warning"):
+        level = "warning"
+    log.configure(level, DEFAULT.get("LOG_JSON", False), DEFAULT.get("LOG_MAX_CHARS", log.MAX_CHARS))
+
+
+def report_profile(DEFAULT):
+    # print the stage table, and append the run's record to PROFILE_JSON
+    print(PROFILER.report())
+    if DEFAULT.get("PROFILE_JSON"):
+        PROFILER.append_json(
+            DEFAULT["PROFILE_JSON"],
+            created=utils.date_string(),
+            argv=sys.argv[1:],
+            output=DEFAULT.get("OUTPUT_FILEPATH"),
+        )
+        LOGGER.info("Appended profile to %s", DEFAULT["PROFILE_JSON"])
+
+
+def start_cprofile(args):
+    # profile the rest of the run with cProfile, writing the outputs at exit
+    # (worker processes are not profiled)
+    profile = cProfile.Profile()
+    atexit.register(stop_cprofile, profile, args)
+    profile.enable()
+
+
+def stop_cprofile(profile, args):
+    profile.disable()
+    stats = pstats.Stats(profile)
+    if args.cprofile:
+        stats.dump_stats(args.cprofile)
+        LOGGER.info("Wrote cProfile statistics to %s", args.cprofile)
+    if args.profile_collapsed:
+        with open(args.profile_collapsed, "w", encoding="utf-8") as file:
+            file.writelines(f"{line}\n" for line in profiler.collapsed_stacks(stats))
+        LOGGER.info("Wrote collapsed stacks to %s", args.profile_collapsed)
+    if args.profile_top:
+        stats.sort_stats("tottime").print_stats(args.profile_top)
 
 
 def main():
     args = cli.get_args()
+    if args.cprofile or args.profile_collapsed or args.profile_top:
+        start_cprofile(args)
 
     if args.read:
         command = read.build_commandline(args.read)
@@ -294,6 +689,44 @@ def main():
         DEFAULT["OPTIMISE_TRAVEL"] = args.optimise_travel
     if getattr(args, 'compound_paths', None) is not None:
         DEFAULT["COMPOUND_PATHS"] = args.compound_paths
+    if args.travel_budget_seconds is not None:
+        DEFAULT["TRAVEL_BUDGET_SECONDS"] = args.travel_budget_seconds
+    if args.png is not None:
+        DEFAULT["PNG_WIDTH"] = args.png
+    if args.log_level is not None:
+        DEFAULT["LOG_LEVEL"] = args.log_level
+    if args.quiet:
+        DEFAULT["LOG_LEVEL"] = "warning"
+    if getattr(args, 'log_json', None) is not None:
+        DEFAULT["LOG_JSON"] = args.log_json
+    if args.log_max_chars is not None:
+        DEFAULT["LOG_MAX_CHARS"] = args.log_max_chars
+    if getattr(args, 'profile', None) is not None:
+        DEFAULT["PROFILE"] = args.profile
+    if getattr(args, 'profile_memory', None) is not None:
+        DEFAULT["PROFILE_MEMORY"] = args.profile_memory
+    if args.profile_json is not None:
+        DEFAULT["PROFILE_JSON"] = args.profile_json
+    if getattr(args, 'screen', None) is not None:
+        DEFAULT["SCREEN"] = args.screen
+    if getattr(args, 'stream', None) is not None:
+        DEFAULT["STREAM"] = args.stream
+    if args.backend is not None:
+        DEFAULT["BACKEND"] = args.backend
+    if getattr(args, 'cache', None) is not None:
+        DEFAULT["CACHE"] = args.cache
+    if args.cache_dir is not None:
+        DEFAULT["CACHE_DIR"] = args.cache_dir
+    if args.max_segments is not None:
+        DEFAULT["MAX_SEGMENTS"] = args.max_segments
+    if args.max_memory_mb is not None:
+        DEFAULT["MAX_MEMORY_MB"] = args.max_memory_mb
+    if args.max_seconds is not None:
+        DEFAULT["MAX_SECONDS"] = args.max_seconds
+    if args.seed is not None:
+        DEFAULT["SEED"] = args.seed
+        if not args.batch:
+            random.seed(args.seed)
 
     DEFAULT.update(
         {
@@ -305,7 +738,14 @@ def main():
     )
     DEFAULT.update({"BLEED": DEFAULT["BLEED"] * DEFAULT["PPMM"]})
 
-    print(f"Default parameters: {DEFAULT}")
+    configure_logging(DEFAULT)
+    LOGGER.info("Default parameters: %s", DEFAULT)
+
+    if open_cache(DEFAULT, base_dir):
+        atexit.register(report_cache)
+    if DEFAULT.get("PROFILE", False):
+        PROFILER.start(DEFAULT.get("PROFILE_MEMORY", True))
+        atexit.register(report_profile, DEFAULT)
 
     # LOCAL VARIABLES
     LINE_LENGTH = DEFAULT.get("LINE_LENGTH", 150)
@@ -329,7 +769,6 @@ def main():
     }
     utils.print_params(PARAM_DICT)
 
-    TRY_COUNT = 0
     if args.rules:
         parsed_string = utils.string_to_dict(args.rules)
         if "str" in parsed_string and len(parsed_string) == 1:
@@ -338,10 +777,10 @@ def main():
             rules = {}
             n_iters = 1
         else:
+            tree = None
             rules = parsed_string
             axiom = args.axiom
             n_iters = RECURSION_DEPTH
-            tree = lsys.set_lsys_string(axiom, rules, n_iters)
 
         divisor = random.choice(ANGLE_DIVS)
         PARAM_DICT = {
@@ -355,16 +794,7 @@ def main():
             "LINE_LENGTH": LINE_LENGTH,
             "CREATED": utils.date_string(),
         }
-        lines = lsys.lsys_to_lines(
-            tree,
-            PARAM_DICT["INITIAL_ANGLE"],
-            PARAM_DICT["LINE_LENGTH"],
-            PARAM_DICT["ROTATE_ANGLE"],
-            weight=DEFAULT.get("LINE_STYLE", {}).get("stroke-width", 10),
-            scale=args.scale,
-            angle_increment=args.angle_increment,
-            weight_increment=args.weight_increment
-        )
+        tree, lines = expand_and_draw(PARAM_DICT, DEFAULT, args, tree)
     elif args.variant:
         command = read.extract_comment(args.variant)
         if not command:
@@ -384,20 +814,7 @@ def main():
         PARAM_DICT["LINE_LENGTH"] = float(PARAM_DICT["LINE_LENGTH"])
         PARAM_DICT["CREATED"] = utils.date_string()
         
-        tree = lsys.set_lsys_string(
-            PARAM_DICT["AXIOM"], PARAM_DICT["RULES"], PARAM_DICT["N"]
-        )
-
-        lines = lsys.lsys_to_lines(
-            tree,
-            PARAM_DICT["INITIAL_ANGLE"],
-            PARAM_DICT["LINE_LENGTH"],
-            PARAM_DICT["ROTATE_ANGLE"],
-            weight=DEFAULT.get("LINE_STYLE", {}).get("stroke-width", 10),
-            scale=args.scale,
-            angle_increment=args.angle_increment,
-            weight_increment=args.weight_increment
-        )
+        tree, lines = expand_and_draw(PARAM_DICT, DEFAULT, args)
     elif args.iterate:
         command = read.extract_comment(args.iterate)
         if not command:
@@ -408,75 +825,17 @@ def main():
             parsed_string = utils.string_to_dict(base_params["RULES"].replace('{', '').replace('}', ''))
             base_params["RULES"] = parsed_string
             
-        constraints = DEFAULT.get("VARIANT_CONSTRAINTS", {})
-        iterate_only = constraints.get("ITERATED_PARAMETERS", ["rules", "N", "angles"])
-        
-        for i in range(args.iterations):
-            base_params = variant.generate_variant(base_params, constraints, iterate_only)
-            PARAM_DICT = base_params.copy()
-            PARAM_DICT["TITLE"] = f"ITERATION {i+1}"
-            PARAM_DICT["N"] = int(PARAM_DICT["N"])
-            PARAM_DICT["INITIAL_ANGLE"] = float(PARAM_DICT["INITIAL_ANGLE"])
-            PARAM_DICT["ROTATE_ANGLE"] = float(PARAM_DICT["ROTATE_ANGLE"])
-            PARAM_DICT["LINE_LENGTH"] = float(PARAM_DICT["LINE_LENGTH"])
-            PARAM_DICT["CREATED"] = utils.date_string()
-            
-            tree = lsys.set_lsys_string(
-                PARAM_DICT["AXIOM"], PARAM_DICT["RULES"], PARAM_DICT["N"]
-            )
-
-            lines = lsys.lsys_to_lines(
-                tree,
-                PARAM_DICT["INITIAL_ANGLE"],
-                PARAM_DICT["LINE_LENGTH"],
-                PARAM_DICT["ROTATE_ANGLE"],
-                weight=DEFAULT.get("LINE_STYLE", {}).get("stroke-width", 10),
-                scale=args.scale,
-                angle_increment=args.angle_increment,
-                weight_increment=args.weight_increment
-            )
-            
-            generate_and_save_svg(PARAM_DICT, tree, lines, DEFAULT, args, base_dir)
-            
+        run_iterate(DEFAULT, args, base_dir, base_params)
+        return
+    elif args.batch:
+        run_batch(DEFAULT, args, base_dir)
         return
     else:
-        while True:
-            TRY_COUNT += 1
-            axiom = lsys.set_axiom(random.choice(range(1, 5)))
-            PARADIGM = DEFAULT.get("PARADIGM", "geometric")
-            OPTIONS = DEFAULT.get("OPTIONS_PER_RULE", 3)
-            rules = lsys.create_rule_dict(
-                axiom, 15, paradigm=PARADIGM, options_per_rule=OPTIONS
-            )
-            divisor = random.choice(ANGLE_DIVS)
-            PARAM_DICT = {
-                "TITLE": "LSYS PARAMS",
-                "PARADIGM": PARADIGM,
-                "N": RECURSION_DEPTH,
-                "AXIOM": axiom,
-                "RULES": rules,
-                "INITIAL_ANGLE": args.initial_angle if args.initial_angle is not None else 90,
-                "ROTATE_ANGLE": args.rotation if args.rotation is not None else 360 / divisor,
-                "LINE_LENGTH": LINE_LENGTH,
-                "CREATED": utils.date_string(),
-            }
-            tree = lsys.set_lsys_string(
-                PARAM_DICT["AXIOM"], PARAM_DICT["RULES"], PARAM_DICT["N"]
-            )
-
-            lines = lsys.lsys_to_lines(
-                tree,
-                PARAM_DICT["INITIAL_ANGLE"],
-                PARAM_DICT["LINE_LENGTH"],
-                PARAM_DICT["ROTATE_ANGLE"],
-                weight=DEFAULT.get("LINE_STYLE", {}).get("stroke-width", 10),
-                scale=args.scale,
-                angle_increment=args.angle_increment,
-                weight_increment=args.weight_increment
-            )
-            if len(lines) >= 5:
-                break
-            print(f"{tree} has {len(lines)} lines, trying again (attempt {TRY_COUNT})")
+        if args.seed is not None:
+            # reseed past the draws above, as batch_job does, so --seed S
+            # draws the same system as batch drawing S
+            random.seed(args.seed)
+        PARAM_DICT, tree, lines, _ = random_lsys(DEFAULT, args, ANGLE_DIVS, LINE_LENGTH, RECURSION_DEPTH)
 
     generate_and_save_svg(PARAM_DICT, tree, lines, DEFAULT, args, base_dir)
 
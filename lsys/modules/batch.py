@@ -0,0 +1,107 @@
+"""
+Process pool helpers for generating many drawings in one launch
+"""
+
+import os
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any
+
+# columns of the summary table: (heading, row key, width, format spec)
+COLUMNS = (
+    ("job", "job", 5, ""),
+    ("seed", "seed", 11, ""),
+    ("tries", "tries", 5, ""),
+    ("segments", "segments", 9, ""),
+    ("gen s", "generate_seconds", 7, ".2f"),
+    ("svg s", "svg_seconds", 7, ".2f"),
+    ("bytes", "size", 10, ""),
+)
+
+
+def run(
+    job: Callable[..., dict[str, Any]],
+    jobs: Iterable[tuple],
+    workers: int | None = None,
+    initializer: Callable[..., None] | None = None,
+    initargs: tuple = (),
+    ordered: bool = False,
+) -> Iterator[dict[str, Any]]:
+    """
+    Run job(*args) for each args in jobs on a pool of worker processes.
+
+    At most twice as many jobs as workers are in flight at once, and jobs is
+    only consumed as slots free up, so the parent holds a bounded amount of
+    work however long the batch is. Results are yielded as they complete,
+    or in the order of jobs if ordered is set. initializer(*initargs) runs
+    once in each worker, for state every job shares.
+    """
+    workers = workers or os.cpu_count() or 1
+    pending = iter(jobs)
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as pool:
+        if ordered:
+            queue: deque[Future] = deque()
+            while True:
+                for args in pending:
+                    queue.append(pool.submit(job, *args))
+                    if len(queue) >= 2 * workers:
+                        break
+                if not queue:
+                    return
+                yield queue.popleft().result()
+        in_flight: set[Future] = set()
+        while True:
+            for args in pending:
+                in_flight.add(pool.submit(job, *args))
+                if len(in_flight) >= 2 * workers:
+                    break
+            if not in_flight:
+                return
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def print_header() -> None:
+    """print the summary table heading"""
+    print(" ".join(f"{heading:>{width}}" for heading, _, width, _ in COLUMNS) + "  file")
+
+
+def print_row(row: dict[str, Any]) -> None:
+    """print one summary table row; failed jobs show their error instead of timings"""
+    if row.get("error"):
+        print(f"{row['job']:>5} {row['seed']:>11}  failed: {row['error']}")
+        return
+    cells = (f"{row[key]:>{width}{spec}}" if key in row else " " * width for _, key, width, spec in COLUMNS)
+    print(" ".join(cells) + f"  {row['file']}")
+
+
+class Summary:
+    """running totals over completed jobs, so the parent keeps no per-job rows"""
+
+    def __init__(self, label: str = "Batch") -> None:
+        self.label = label
+        self.done = 0
+        self.failed = 0
+        self.generate_seconds = 0.0
+        self.svg_seconds = 0.0
+        self.size = 0
+
+    def add(self, row: dict[str, Any]) -> None:
+        if row.get("error"):
+            self.failed += 1
+            return
+        self.done += 1
+        self.generate_seconds += row["generate_seconds"]
+        self.svg_seconds += row["svg_seconds"]
+        self.size += row["size"]
+
+    def report(self, wall_seconds: float) -> str:
+        if not self.done:
+            return f"{self.label}: 0 drawings, {self.failed} failed in {wall_seconds:.2f}s"
+        return (
+            f"{self.label}: {self.done} drawings, {self.failed} failed in {wall_seconds:.2f}s "
+            f"({self.done / wall_seconds:.2f}/s); mean generate {self.generate_seconds / self.done:.2f}s, "
+            f"svg {self.svg_seconds / self.done:.2f}s, size {self.size / self.done / 1000:.1f}k"
+        )
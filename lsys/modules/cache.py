@@ -0,0 +1,142 @@
+"""
+On-disk cache of expanded L-System strings and segment buffers
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import zlib
+from array import array
+from pathlib import Path
+from typing import Any
+
+from modules.segments import SegmentBuffer
+
+
+class Cache:
+    """
+    Content-addressed store under one directory, capped at max_bytes.
+
+    Entries are files named by a hash of the inputs that produced them (see
+    key), with a suffix for their kind:
+
+        .lsys   an expanded string, zlib compressed
+        .seg    a segment buffer as raw native doubles (x1, y1, x2, y2, w),
+                so it can be mapped straight into an array or numpy.memmap
+        .state  a pickled random state, to restore after a stochastic hit
+
+    Files are written to a temporary name and renamed into place, so worker
+    processes can share a directory. A hit touches the file's mtime, and
+    writes evict the least recently used files once the directory is over
+    max_bytes. stats counts hits, misses, writes and evictions.
+    """
+
+    def __init__(self, directory: str | Path, max_bytes: int) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        self.size = self._disk_size()
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        """hash inputs (anything JSON can write, dicts in any key order) to a key"""
+        text = json.dumps(parts, sort_keys=True, default=repr)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _entries(self) -> list[os.DirEntry]:
+        # cache files, leaving out the .name.pid files writers are still filling
+        return [entry for entry in os.scandir(self.directory) if entry.is_file() and not entry.name.startswith(".")]
+
+    def _disk_size(self) -> int:
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def _path(self, key: str, kind: str) -> Path:
+        return self.directory / f"{key}.{kind}"
+
+    def _read(self, key: str, kind: str, count: bool = True) -> bytes | None:
+        path = self._path(key, kind)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            if count:
+                self.stats["misses"] += 1
+            return None
+        if count:
+            self.stats["hits"] += 1
+        return data
+
+    def _write(self, key: str, kind: str, data: bytes) -> None:
+        path = self._path(key, kind)
+        temp = path.with_name(f".{path.name}.{os.getpid()}")
+        temp.write_bytes(data)
+        temp.replace(path)
+        self.stats["writes"] += 1
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        """
+        delete least recently used files until the directory fits in
+        max_bytes. Temporary files are never deleted: another process may be
+        about to rename one into place
+        """
+        entries = self._entries()
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        self.size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self.size <= self.max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except FileNotFoundError:
+                # another process got there first
+                continue
+            self.size -= size
+            self.stats["evictions"] += 1
+
+    def get_string(self, key: str) -> str | None:
+        data = self._read(key, "lsys")
+        return None if data is None else zlib.decompress(data).decode("utf-8")
+
+    def put_string(self, key: str, string: str) -> None:
+        self._write(key, "lsys", zlib.compress(string.encode("utf-8"), 1))
+
+    def get_segments(self, key: str) -> SegmentBuffer | None:
+        data = self._read(key, "seg")
+        if data is None:
+            return None
+        segments = array("d")
+        segments.frombytes(data)
+        return SegmentBuffer(segments)
+
+    def put_segments(self, key: str, segments: SegmentBuffer) -> None:
+        self._write(key, "seg", segments.data.tobytes())
+
+    def get_state(self, key: str) -> Any:
+        # states ride along with a string or segment hit, so are not counted
+        data = self._read(key, "state", count=False)
+        return None if data is None else pickle.loads(data)
+
+    def put_state(self, key: str, state: Any) -> None:
+        self._write(key, "state", pickle.dumps(state))
+
+    def merge(self, stats: dict[str, int] | None) -> None:
+        """add counts from another process's cache"""
+        for name, count in (stats or {}).items():
+            self.stats[name] += count
+
+    def report(self) -> str:
+        # other processes may have written to the directory too
+        self.size = self._disk_size()
+        lookups = self.stats["hits"] + self.stats["misses"]
+        rate = f" ({self.stats['hits'] / lookups:.0%})" if lookups else ""
+        return (
+            f"Cache: {self.stats['hits']} hits, {self.stats['misses']} misses{rate}, "
+            f"{self.stats['writes']} writes, {self.stats['evictions']} evictions, "
+            f"{self.size / 1e6:.1f}MB in {self.directory}"
+        )
@@ -1,5 +1,12 @@
 import argparse
 
+def positive_int(value: str) -> int:
+    """argparse type for a whole number of at least 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, not {number}")
+    return number
+
 def get_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="L-System SVG Generator")
     parser.add_argument(
@@ -53,4 +60,27 @@ def get_args() -> argparse.Namespace:
     parser.add_argument("--merge", action=argparse.BooleanOptionalAction, help="Merge continuous lines with the same vector")
     parser.add_argument("--optimise-travel", action=argparse.BooleanOptionalAction, help="Optimise plotter travel distance (TSP)")
     parser.add_argument("--compound-paths", action=argparse.BooleanOptionalAction, help="Combine continuous lines into compound SVG paths")
+    parser.add_argument("--travel-budget-seconds", type=float, help="Seconds to spend refining the --optimise-travel tour with 2-opt/Or-opt (0 = off)")
+    parser.add_argument("--max-segments", type=int, help="Pick the deepest recursion (up to --recursion) predicted to draw at most this many segments")
+    parser.add_argument("--max-memory-mb", type=float, help="Pick the deepest recursion predicted to fit in this much memory")
+    parser.add_argument("--max-seconds", type=float, help="Pick the deepest recursion predicted to finish in this many seconds")
+    parser.add_argument("--screen", action=argparse.BooleanOptionalAction, help="Reject degenerate random rules from a shallow expansion before expanding them in full")
+    parser.add_argument("--stream", action=argparse.BooleanOptionalAction, help="Expand the L-System lazily instead of building the full string (no length cap)")
+    parser.add_argument("--backend", type=str, choices=["python", "numpy"], help="Turtle interpreter backend (numpy is optional)")
+    parser.add_argument("--batch", type=int, help="Generate N random drawings in one launch, across a pool of worker processes", default=None)
+    parser.add_argument("--workers", type=int, help="Worker processes for --batch and --iterate (default: CPU count)", default=None)
+    parser.add_argument("--seed", type=int, help="Random seed (with --batch, drawing i uses seed + i)", default=None)
+    parser.add_argument("--cache", action=argparse.BooleanOptionalAction, help="Reuse expanded strings and segments cached on disk by earlier runs")
+    parser.add_argument("--cache-dir", type=str, help="Directory for the on-disk cache")
+    parser.add_argument("--png", type=positive_int, metavar="WIDTH", help="Also write a PNG preview this many pixels wide beside the svg")
+    parser.add_argument("--log-level", type=str, choices=["debug", "info", "warning", "error"], help="Least severe messages to log")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only log warnings and errors (same as --log-level warning)")
+    parser.add_argument("--log-json", action=argparse.BooleanOptionalAction, help="Log one JSON object per line instead of text")
+    parser.add_argument("--log-max-chars", type=int, help="Truncate logged rules, trees and other payloads to this many characters (0 = no limit)")
+    parser.add_argument("--profile", action=argparse.BooleanOptionalAction, help="Time each stage, with its peak memory, and print a summary table")
+    parser.add_argument("--profile-memory", action=argparse.BooleanOptionalAction, help="Trace each --profile stage's peak memory (slows allocation heavy stages)")
+    parser.add_argument("--profile-json", type=str, help="Append each --profile run's record to this JSON lines file")
+    parser.add_argument("--cprofile", type=str, help="Profile the run with cProfile and write pstats to this file")
+    parser.add_argument("--profile-collapsed", type=str, help="Write the cProfile call graph as collapsed stacks for flamegraph tools to this file")
+    parser.add_argument("--profile-top", type=int, help="Print the N functions with the most cProfile internal time")
     return parser.parse_args()
@@ -0,0 +1,100 @@
+"""
+Collinear segment helpers
+"""
+
+from collections.abc import Iterable
+from math import gcd, hypot
+
+Point = tuple[float, float]
+Line = tuple[Point, Point, float]
+
+
+def supporting_lines(
+    lines: Iterable[Line], precision: int
+) -> tuple[dict[tuple, list[tuple[int, int, Point, Point, int]]], list[Line]]:
+    """
+    Buckets lines by the infinite line they lie on.
+
+    Coordinates are rounded to precision places, so they can be scaled to
+    exact integers. Each bucket key is (weight, dx, dy, offset). (dx, dy) is
+    the reduced integer direction, pointing right (or up when vertical).
+    offset is the cross product of the direction with any point on the line.
+    Each entry is (t1, t2, start, end, index), with t the projection onto
+    the direction, t1 <= t2 and index the line's position in lines. Zero
+    length lines are returned separately.
+    """
+    scale = 10 ** max(precision, 0)
+    buckets: dict[tuple, list[tuple[int, int, Point, Point, int]]] = {}
+    points = []
+    for index, (start, end, weight) in enumerate(lines):
+        x1, y1 = round(start[0] * scale), round(start[1] * scale)
+        x2, y2 = round(end[0] * scale), round(end[1] * scale)
+        dx, dy = x2 - x1, y2 - y1
+        if dx == 0 and dy == 0:
+            points.append((start, end, weight))
+            continue
+        divisor = gcd(dx, dy)
+        dx, dy = dx // divisor, dy // divisor
+        if dx < 0 or (dx == 0 and dy < 0):
+            dx, dy = -dx, -dy
+        t1, t2 = dx * x1 + dy * y1, dx * x2 + dy * y2
+        if t1 > t2:
+            t1, t2, start, end = t2, t1, end, start
+        key = (weight, dx, dy, dx * y1 - dy * x1)
+        buckets.setdefault(key, []).append((t1, t2, start, end, index))
+    return buckets, points
+
+
+def merge_collinear(lines: Iterable[Line], precision: int) -> list[Line]:
+    """
+    Merges every run of collinear lines that touch or overlap.
+
+    Lines are bucketed by supporting line (see supporting_lines). Each bucket
+    is sorted by projection and swept once, extending the current span while
+    the next line starts at or before its end. Touching and overlapping
+    lines merge, and so do reversed ones, since each line is oriented along
+    its bucket's direction first.
+    """
+    buckets, merged = supporting_lines(lines, precision)
+    for (weight, *_), spans in buckets.items():
+        spans.sort(key=lambda span: span[0])
+        _, end_t, start, end, _ = spans[0]
+        for t1, t2, span_start, span_end, _ in spans[1:]:
+            if t1 <= end_t:
+                if t2 > end_t:
+                    end_t, end = t2, span_end
+                continue
+            merged.append((start, end, weight))
+            end_t, start, end = t2, span_start, span_end
+        merged.append((start, end, weight))
+    return merged
+
+
+def clip_overlaps(lines: Iterable[Line], precision: int) -> tuple[list[Line], float]:
+    """
+    Clips collinear lines so that no stretch of a line is drawn twice.
+
+    Unlike merge_collinear, lines are not joined: each bucket (see
+    supporting_lines) is swept in projection order, and every line is cut
+    back to the part not already covered by the lines before it, or
+    dropped when it is covered entirely. Kept lines come out in their
+    original order, oriented along their bucket's direction. Returns the
+    lines and the stroke length removed.
+    """
+    buckets, points = supporting_lines(lines, precision)
+    kept: list[tuple[int, Line]] = []
+    removed = 0.0
+    for (weight, *_), spans in buckets.items():
+        spans.sort(key=lambda span: span[0])
+        covered_t, covered = None, None
+        for t1, t2, start, end, index in spans:
+            if covered_t is not None and t2 <= covered_t:
+                removed += hypot(end[0] - start[0], end[1] - start[1])
+                continue
+            if covered_t is not None and t1 < covered_t:
+                removed += hypot(covered[0] - start[0], covered[1] - start[1])
+                start = covered
+            kept.append((index, (start, end, weight)))
+            covered_t, covered = t2, end
+    kept.sort(key=lambda item: item[0])
+    return points + [line for _, line in kept], removed
@@ -0,0 +1,93 @@
+"""
+Logging for the pipeline: levels, truncated payloads and a JSON lines mode
+"""
+
+import json
+import logging
+import sys
+
+LOGGER = logging.getLogger("lsys")
+
+# payloads (strings and containers passed as arguments) longer than this are cut
+MAX_CHARS = 2000
+
+LEVELS = ("debug", "info", "warning", "error")
+
+# ANSI codes for the colours records can ask for with extra={"colour": name}
+COLOURS = {"red": "\033[1m\033[91m", "amber": "\033[1m\033[93m", "green": "\033[1m\033[92m"}
+NORMAL = "\033[0m"
+
+
+def shorten(text: str, max_chars: int = MAX_CHARS) -> str:
+    """cut text to max_chars (0 = no limit), noting how much was left out"""
+    if not max_chars or len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}... ({len(text) - max_chars:,} more characters)"
+
+
+class TextFormatter(logging.Formatter):
+    """
+    Formats the message alone, as the pipeline printed it, after cutting any
+    string or container arguments to max_chars. Numbers are left alone, so
+    format specs like %.1f still apply. Messages are only formatted once a
+    record is emitted, so arguments cost nothing at disabled levels. Records
+    logged with extra={"colour": name} are wrapped in that ANSI colour.
+    """
+
+    def __init__(self, max_chars: int = MAX_CHARS) -> None:
+        super().__init__()
+        self.max_chars = max_chars
+
+    def message(self, record: logging.LogRecord) -> str:
+        if isinstance(record.args, dict) and "%(" not in str(record.msg):
+            # logging unpacks a lone mapping argument, as if for %(key)s
+            record.args = (record.args,)
+        if isinstance(record.args, tuple):
+            record.args = tuple(
+                shorten(str(arg), self.max_chars) if isinstance(arg, (str, dict, list, tuple, set)) else arg
+                for arg in record.args
+            )
+        return record.getMessage()
+
+    def format(self, record: logging.LogRecord) -> str:
+        colour = COLOURS.get(getattr(record, "colour", None))
+        message = self.message(record)
+        return f"{colour}{message}{NORMAL}" if colour else message
+
+
+class JsonFormatter(TextFormatter):
+    """
+    Formats each record as one line of JSON: time, level and message, plus
+    any fields passed as extra={"fields": {...}}
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": record.created,
+            "level": record.levelname.lower(),
+            "message": self.message(record),
+        }
+        for name, value in getattr(record, "fields", {}).items():
+            entry[name] = shorten(value, self.max_chars) if isinstance(value, str) else value
+        return json.dumps(entry, default=lambda value: shorten(str(value), self.max_chars))
+
+
+class StdoutHandler(logging.StreamHandler):
+    """writes to sys.stdout as it is at each record, so redirect_stdout applies"""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, _value):
+        pass
+
+
+def configure(level: str = "info", json_lines: bool = False, max_chars: int = MAX_CHARS) -> None:
+    """send LOGGER's records at level and above to stdout, as text or JSON lines"""
+    handler = StdoutHandler()
+    handler.setFormatter(JsonFormatter(max_chars) if json_lines else TextFormatter(max_chars))
+    LOGGER.handlers[:] = [handler]
+    LOGGER.setLevel(level.upper())
+    LOGGER.propagate = False
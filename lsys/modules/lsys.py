@@ -1,55 +1,322 @@
 """L-System Functions"""
 
 import random
-from math import cos, sin, radians
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from fractions import Fraction
+from functools import lru_cache, reduce
+from itertools import chain, groupby
+from math import cos, gcd, sin, radians
 import re
 from typing import Any
 
+from .log import LOGGER
+from .segments import SegmentBuffer
 
-def set_lsys_string(axiom: str, rules: dict[str, str | list[str]], n: int, max_length: int = 100000) -> str:
+# largest heading table built for quantised angles (0.01 degree resolution)
+MAX_HEADING_STEPS = 36000
+
+# rough costs choose_depth uses to estimate a generation's memory and time:
+# one byte per symbol of the string, a 40 byte SegmentBuffer entry per
+# segment plus the copy later stages make, and measured interpreter and
+# output throughput
+BYTES_PER_SEGMENT = 80
+SECONDS_PER_SYMBOL = 1.2e-6
+SECONDS_PER_SEGMENT = 3e-6
+
+
+def _placeholders(count: int, avoid: list[str]) -> list[str]:
+    """return count private-use characters that appear in none of avoid"""
+    found = []
+    code = 0xE000
+    while len(found) < count:
+        placeholder = chr(code)
+        if not any(placeholder in text for text in avoid):
+            found.append(placeholder)
+        code += 1
+    return found
+
+
+def rewrite_generation(string: str, rules: dict[str, str | list[str]]) -> str:
     """
-    Generates a string of characters based on the axiom and rules.
+    Applies the rules to every character of string once.
+
+    Each symbol with a rule is first swapped for a unique placeholder so that
+    replacements are never rewritten twice within a generation. Deterministic
+    placeholders are then expanded with str.replace; stochastic ones are split
+    out and sampled with random.choice in string order, so a fixed seed gives
+    the same result as a per-character rewrite.
     """
-    string = axiom
+    active = {key: value for key, value in rules.items() if len(key) == 1 and key in string}
+    if not active:
+        return string
+
+    options = [v for value in active.values() for v in (value if isinstance(value, list) else [value])]
+    placeholders = _placeholders(len(active), [string, *options])
+    stochastic = {}
+    for (key, value), placeholder in zip(active.items(), placeholders):
+        string = string.replace(key, placeholder)
+        if isinstance(value, list):
+            stochastic[placeholder] = value
+    for (key, value), placeholder in zip(active.items(), placeholders):
+        if not isinstance(value, list):
+            string = string.replace(placeholder, value)
+    if not stochastic:
+        return string
+
+    choice = random.choice
+    pieces = re.split(f"([{''.join(stochastic)}])", string)
+    for i in range(1, len(pieces), 2):
+        pieces[i] = choice(stochastic[pieces[i]])
+    return "".join(pieces)
+
+
+def _deterministic_rules(rules: dict[str, str | list[str]]) -> dict[str, str] | None:
+    """the rules rewrite_generation applies, or None if any of them is stochastic"""
+    active = {key: value for key, value in rules.items() if len(key) == 1}
+    if any(isinstance(value, list) for value in active.values()):
+        return None
+    return active
+
+
+def predict_lengths(
+    axiom: str, rules: dict[str, str | list[str]], n: int, drawn: str = "FG", upper_bound: bool = False
+) -> list[tuple[int, int]] | None:
+    """
+    Predicts the string length after each generation without expanding it.
+
+    Every occurrence of a symbol grows the same way, so it is enough to
+    track, per symbol, the length of its expansion and how many drawn
+    symbols it holds, one generation at a time: O(|alphabet| * n) work.
+    Returns [(length, drawn count)] for generations 0..n, where the drawn
+    count is an upper bound on the segments drawn (runs of F merge into one
+    segment). Stochastic rules return None, unless upper_bound is set, in
+    which case each symbol takes its longest option at every generation.
+    """
+    active = {key: value for key, value in rules.items() if len(key) == 1}
+    if not upper_bound and _deterministic_rules(active) is None:
+        return None
+    alphabet = set(axiom).union(active)
+    makeup = {}
+    for key, value in active.items():
+        options = value if isinstance(value, list) else [value]
+        makeup[key] = [Counter(option) for option in options]
+        alphabet.update(*options)
+    lengths = dict.fromkeys(alphabet, 1)
+    draws = {c: int(c in drawn) for c in alphabet}
+    axiom_counts = Counter(axiom)
+
+    def totals() -> tuple[int, int]:
+        return (
+            sum(count * lengths[c] for c, count in axiom_counts.items()),
+            sum(count * draws[c] for c, count in axiom_counts.items()),
+        )
+
+    def grow(sizes: dict[str, int]) -> dict[str, int]:
+        return {
+            c: max(sum(k * sizes[s] for s, k in option.items()) for option in makeup[c]) if c in makeup else sizes[c]
+            for c in alphabet
+        }
+
+    predicted = [totals()]
     for _ in range(n):
-        # Safety check to prevent exponential memory overflow
-        if len(string) > (max_length // 10):
-            print(f"Stopping early to prevent memory overflow (Length: {len(string)})")
+        lengths, draws = grow(lengths), grow(draws)
+        predicted.append(totals())
+    return predicted
+
+
+def choose_depth(
+    axiom: str,
+    rules: dict[str, str | list[str]],
+    n: int,
+    max_segments: int = 0,
+    max_bytes: int = 0,
+    max_seconds: float = 0,
+) -> int:
+    """
+    Returns the deepest generation, up to n, whose predicted cost fits every
+    nonzero budget.
+
+    Costs come from predict_lengths (upper bounds for stochastic rules),
+    with memory and time estimated from BYTES_PER_SEGMENT, SECONDS_PER_SYMBOL
+    and SECONDS_PER_SEGMENT. Returns 0 if even the axiom is over budget.
+    """
+    depth = 0
+    for generation, (length, segments) in enumerate(predict_lengths(axiom, rules, n, upper_bound=True)):
+        if max_segments and segments > max_segments:
+            break
+        if max_bytes and length + segments * BYTES_PER_SEGMENT > max_bytes:
+            break
+        if max_seconds and length * SECONDS_PER_SYMBOL + segments * SECONDS_PER_SEGMENT > max_seconds:
             break
+        depth = generation
+    return depth
 
-        next_string = ""
-        for c in string:
-            replacement = rules.get(c, c)
-            if isinstance(replacement, list):
-                next_string += random.choice(replacement)
-            else:
-                next_string += replacement
-        string = next_string
 
-        if len(string) >= max_length:
-            print("Reached max_length during generation.")
-            break
+def expand_memo(axiom: str, rules: dict[str, str], n: int) -> str:
+    """
+    Expands deterministic rules n times, expanding each symbol once per depth.
+
+    expansion[c] holds what c becomes after d generations; the next depth
+    joins the expansions of the symbols in c's rule, so every occurrence of
+    a symbol shares one expansion instead of being rewritten separately.
+    """
+    rules = {key: value for key, value in rules.items() if len(key) == 1}
+    if n <= 0:
+        return axiom
+    expansion = {c: value for c, value in rules.items()}
+    for _ in range(n - 1):
+        expansion = {c: "".join([expansion.get(s, s) for s in value]) for c, value in rules.items()}
+    return "".join([expansion.get(c, c) for c in axiom])
+
+
+def guard_depth(predicted: list[tuple[int, int]], max_length: float) -> tuple[int, str | None]:
+    """
+    Returns the generation at which set_lsys_string's max_length guard stops
+    expanding, given predict_lengths output, and the message it prints then
+    (None if all of the generations fit).
+    """
+    depth = 0
+    for length, _ in predicted[:-1]:
+        # Safety check to prevent exponential memory overflow
+        if length > (max_length // 10):
+            return depth, f"Stopping early to prevent memory overflow (Length: {length})"
+        depth += 1
+        if predicted[depth][0] >= max_length:
+            return depth, "Reached max_length during generation."
+    return depth, None
+
+
+def set_lsys_string(axiom: str, rules: dict[str, str | list[str]], n: int, max_length: int | None = 100000) -> str:
+    """
+    Generates a string of characters based on the axiom and rules.
+    A max_length of None turns the length guard off (see choose_depth).
+
+    Deterministic rules are sized up front with predict_lengths, so the
+    depth at which the max_length guard stops is known before expanding,
+    and the string is built once with expand_memo. Stochastic rules are
+    rewritten a generation at a time.
+    """
+    if max_length is None:
+        max_length = float("inf")
+    predicted = predict_lengths(axiom, rules, n)
+    if predicted is not None:
+        depth, message = guard_depth(predicted, max_length)
+        if message:
+            LOGGER.info("%s", message)
+        string = expand_memo(axiom, rules, depth)
+    else:
+        string = axiom
+        for _ in range(n):
+            # Safety check to prevent exponential memory overflow
+            if len(string) > (max_length // 10):
+                LOGGER.info("Stopping early to prevent memory overflow (Length: %d)", len(string))
+                break
+
+            string = rewrite_generation(string, rules)
+
+            if len(string) >= max_length:
+                LOGGER.info("Reached max_length during generation.")
+                break
 
     if not is_valid_rule(string):
-        print(f"Invalid rule: {string}")
+        LOGGER.warning("Invalid rule: %s", string)
     return string
 
 
+def iter_lsys_string(axiom: str, rules: dict[str, str | list[str]], n: int) -> Iterator[str]:
+    """
+    Lazily expands the axiom depth-first, yielding chunks of the final string.
+
+    Unlike set_lsys_string, the full string is never held in memory: only one
+    partially consumed string per generation is kept, so memory grows with n
+    rather than with the output length and no max_length cap is needed.
+    Stochastic rules are still drawn with random.choice, but in depth-first
+    order, so a seeded run differs from set_lsys_string's breadth-first draw.
+    """
+    rules = {key: value for key, value in rules.items() if len(key) == 1}
+    if n <= 0 or not rules:
+        yield axiom
+        return
+
+    ruled = re.compile("[" + "".join(re.escape(key) for key in rules) + "]")
+    stack = [(axiom, 0)]
+    while stack:
+        string, pos = stack.pop()
+        match = ruled.search(string, pos)
+        if match is None:
+            if pos < len(string):
+                yield string[pos:]
+            continue
+        i = match.start()
+        if pos < i:
+            yield string[pos:i]
+        replacement = rules[string[i]]
+        if isinstance(replacement, list):
+            replacement = random.choice(replacement)
+        stack.append((string, i + 1))
+        # the stack now holds one entry per generation above the replacement
+        if len(stack) == n:
+            yield replacement
+        else:
+            stack.append((replacement, 0))
+
+
+def heading_steps(*angles: float) -> int | None:
+    """
+    Returns the number of discrete headings the angles can reach.
+
+    If every angle (together with the 180 degree flip) is a whole multiple of
+    360 / steps, headings can be tracked as integer indices into a table of
+    that many unit vectors. Returns None if the angles don't quantise to at
+    most MAX_HEADING_STEPS headings.
+    """
+    fractions = [Fraction(360), Fraction(180)]
+    for angle in angles:
+        fraction = Fraction(angle).limit_denominator(1000)
+        if abs(float(fraction) - angle) > 1e-9 * max(1.0, abs(angle)):
+            return None
+        fractions.append(fraction)
+    # gcd of fractions: gcd of the numerators over the lcm of the denominators
+    denominator = reduce(lambda a, b: a * b // gcd(a, b), (f.denominator for f in fractions))
+    numerator = reduce(gcd, (int(f * denominator) for f in fractions))
+    steps = 360 * denominator // numerator
+    if steps > MAX_HEADING_STEPS:
+        return None
+    return steps
+
+
+@lru_cache(maxsize=32)
+def heading_table(steps: int) -> tuple[tuple[float, float], ...]:
+    """returns the (cos, sin) unit vector of each of steps equally spaced headings"""
+    return tuple((cos(radians(i * 360 / steps)), sin(radians(i * 360 / steps))) for i in range(steps))
+
+
 def lsys_to_lines(
-    lsys: str, 
+    lsys: str | Iterable[str],
     angle: float, 
     length: float, 
     angle_offset: float,
     weight: float = 1.0,
     scale: float = 1.2,
     angle_increment: float = 15.0,
-    weight_increment: float = 1.0
-) -> set[tuple[tuple[float, float], tuple[float, float], float]]:
+    weight_increment: float = 1.0,
+    stats: dict[str, int] | None = None,
+) -> SegmentBuffer:
     """
     Generates a list of lines from a string of characters.
 
+    The string is walked a run of identical symbols at a time, each run
+    folded into one operation: a run of F, G or f is one move of count
+    lengths (F and G runs stay apart, so "FG" is still two segments), and a run of turns,
+    weight, length or angle changes is applied once, multiplied by count
+    (or, for lengths, raised to the power count). Draws, branches and turns,
+    which make up nearly every run, are handled inline; the rest of the
+    extended instruction set is dispatched through a table of handlers.
+
     Parameters:
-    lsys (str):             The string of characters to convert to lines.
+    lsys (str | Iterable):  The string of characters to convert to lines, or
+                            an iterable of string chunks (see iter_lsys_string).
     angle (float):          The initial heading angle.
     length (float):         The starting length of the lines.
     angle_offset (float):   The step angle.
@@ -57,59 +324,246 @@ def lsys_to_lines(
     scale (float):          Multiplier for length changes.
     angle_increment (float):Amount to adjust step angle.
     weight_increment (float):Amount to adjust line width.
+    stats (dict):           If given, "symbols" and "operations" are set to
+                            the instruction stream's length before and
+                            after folding, and "segments" to the number of
+                            lines drawn before duplicates are removed.
 
     Returns:
-    set: A set of lines generated from the string of characters.
+    SegmentBuffer: The unique lines generated from the string of characters,
+    with their bounding box.
     """
-    lines = []
+    lines = SegmentBuffer()
+    add_line = lines.data.extend
     stack = []
+    push, pop = stack.append, stack.pop
     x, y = 0.0, 0.0
     rotation_direction = 1
 
-    i = 0
-    while i < len(lsys):
-        c = lsys[i]
-        if c in ("F", "G"):
-            count = 1
-            while i + count < len(lsys) and lsys[i + count] == c:
-                count += 1
-            x2 = x - length * count * cos(radians(angle))
-            y2 = y - length * count * sin(radians(angle))
-            lines.append(((x, y), (x2, y2), weight))
-            x, y = x2, y2
-            i += count - 1
-        elif c == "f":
-            x2 = x - length * cos(radians(angle))
-            y2 = y - length * sin(radians(angle))
+    # with quantised angles, track the heading as an integer index into a
+    # precomputed table, so repeated turns can't drift
+    steps = heading_steps(angle, angle_offset, angle_increment)
+    if steps is not None:
+        table = heading_table(steps)
+        unit = 360 / steps
+        angle, angle_offset, angle_increment = (round(a / unit) for a in (angle, angle_offset, angle_increment))
+        half_turn = steps // 2
+
+        def direction(heading):
+            return table[heading % steps]
+    else:
+        half_turn = 180
+
+        def direction(heading):
+            return cos(radians(heading)), sin(radians(heading))
+
+    # handlers for the rarer symbols, each taking the length of its run
+    def move(count):
+        nonlocal x, y
+        dx, dy = direction(angle)
+        x, y = x - length * count * dx, y - length * count * dy
+
+    def flip(count):
+        nonlocal angle
+        angle += half_turn * count
+
+    def thicker(count):
+        nonlocal weight
+        weight += weight_increment * count
+
+    def thinner(count):
+        nonlocal weight
+        weight -= weight_increment * count
+
+    def longer(count):
+        nonlocal length
+        length *= scale**count
+
+    def shorter(count):
+        nonlocal length
+        length /= scale**count
+
+    def invert(count):
+        nonlocal rotation_direction
+        if count % 2:
+            rotation_direction = -rotation_direction
+
+    def widen(count):
+        nonlocal angle_offset
+        angle_offset += angle_increment * count
+
+    def narrow(count):
+        nonlocal angle_offset
+        angle_offset -= angle_increment * count
+
+    handlers = {
+        "f": move,
+        "|": flip,
+        "#": thicker,
+        "!": thinner,
+        ">": longer,
+        "<": shorter,
+        "&": invert,
+        "(": widen,
+        ")": narrow,
+    }.get
+
+    symbols = 0
+    if stats is not None and not isinstance(lsys, str):
+
+        def counted(chunks):
+            nonlocal symbols
+            for chunk in chunks:
+                symbols += len(chunk)
+                yield chunk
+
+        lsys = counted(lsys)
+
+    operations = 0
+    # the bounding box of every drawn end point, so later stages don't scan for it
+    min_x = min_y = float("inf")
+    max_x = max_y = float("-inf")
+    # runs of identical symbols are grouped even across chunk boundaries
+    for op, run in groupby(lsys if isinstance(lsys, str) else chain.from_iterable(lsys)):
+        operations += 1
+        if op == "F" or op == "G":
+            count = len(list(run))
+            dx, dy = direction(angle)
+            x2 = x - length * count * dx
+            y2 = y - length * count * dy
+            add_line((x, y, x2, y2, weight))
+            if x < min_x:
+                min_x = x
+            if x > max_x:
+                max_x = x
+            if y < min_y:
+                min_y = y
+            if y > max_y:
+                max_y = y
+            if x2 < min_x:
+                min_x = x2
+            if x2 > max_x:
+                max_x = x2
+            if y2 < min_y:
+                min_y = y2
+            if y2 > max_y:
+                max_y = y2
             x, y = x2, y2
-        elif c == "+":
-            angle += angle_offset * rotation_direction
-        elif c == "-":
-            angle += angle_offset * -rotation_direction
-        elif c == "|":
-            angle += 180
-        elif c == "[":
-            stack.append((x, y, angle, angle_offset, length, weight, rotation_direction))
+        elif op == "[":
+            state = (x, y, angle, angle_offset, length, weight, rotation_direction)
+            for _ in run:
+                push(state)
+        elif op == "]":
+            for _ in run:
+                if stack:
+                    x, y, angle, angle_offset, length, weight, rotation_direction = pop()
+        elif op == "+":
+            angle += angle_offset * rotation_direction * len(list(run))
+        elif op == "-":
+            angle -= angle_offset * rotation_direction * len(list(run))
+        else:
+            handler = handlers(op)
+            if handler:
+                handler(len(list(run)))
+
+    if stats is not None:
+        stats["symbols"] = len(lsys) if isinstance(lsys, str) else symbols
+        stats["operations"] = operations
+        stats["segments"] = len(lines)
+    if lines:
+        lines.box = (min_x, min_y, max_x, max_y)
+    lines.dedupe()
+    return lines
+
+
+def branch_balance(rule_string: str) -> bool:
+    """checks that every [ in a rule string is closed, and no ] comes before its ["""
+    depth = 0
+    for c in rule_string:
+        if c == "[":
+            depth += 1
         elif c == "]":
-            if stack:
-                x, y, angle, angle_offset, length, weight, rotation_direction = stack.pop()
-        elif c == "#":
-            weight += weight_increment
-        elif c == "!":
-            weight -= weight_increment
-        elif c == ">":
-            length *= scale
-        elif c == "<":
-            length /= scale
-        elif c == "&":
-            rotation_direction = -rotation_direction
-        elif c == "(":
-            angle_offset += angle_increment
-        elif c == ")":
-            angle_offset -= angle_increment
-        i += 1
+            depth -= 1
+            if depth < 0:
+                return False
+    return depth == 0
 
-    return set(lines)
+
+def screen_rules(
+    axiom: str,
+    rules: dict[str, str | list[str]],
+    n: int,
+    angle: float,
+    angle_offset: float,
+    max_length: int | None = 100000,
+    shallow: int = 3,
+    min_segments: int = 5,
+    min_unique_ratio: float = 0.15,
+    **turtle: float,
+) -> str | None:
+    """
+    Predicts, from the rules and a shallow expansion, whether expanding them
+    n times will draw something worth keeping. Returns the reason a system
+    is degenerate, tiny or explosive, or None if it looks usable.
+
+    - branch balance: a rule with an unmatched bracket leaks turtle state
+    - tiny: fewer than min_segments drawn symbols at n, even taking the
+      longest option of stochastic rules (see predict_lengths)
+    - explosive: the max_length guard would stop the expansion by the
+      shallow depth, so the full run draws nothing a shallow one wouldn't
+    - unique segment ratio: fewer than min_unique_ratio of the segments
+      drawn at the shallow depth are unique, so the drawing mostly retraces
+      itself
+    - bounding box growth: the drawing's extent hasn't grown over the last
+      two shallow generations, and its unique segments less than doubled
+      in the last one, so deeper generations crowd the same small figure
+
+    Only generations up to shallow are expanded and drawn, with angle,
+    angle_offset and the lsys_to_lines keywords in turtle. Stochastic rules
+    are only checked for branch balance and size, so screening never draws
+    from the random state.
+    """
+    for value in rules.values():
+        for option in value if isinstance(value, list) else [value]:
+            if not branch_balance(option):
+                return f"has unbalanced branches ({option})"
+
+    predicted = predict_lengths(axiom, rules, n, upper_bound=True)
+    deterministic = _deterministic_rules(rules) is not None
+    if deterministic and max_length is not None:
+        depth, _ = guard_depth(predicted, max_length)
+        if depth < n and depth <= shallow:
+            return f"explodes, the length guard stops at N={depth}"
+        n = depth
+    if predicted[n][1] < min_segments:
+        return f"draws at most {predicted[n][1]} segments at N={n}"
+    if not deterministic:
+        # one shallow draw of stochastic rules says little about a deep one
+        return None
+    if n < 2:
+        return None
+
+    # (unique segments, extent) of each shallow generation
+    drawings = []
+    string = axiom
+    for generation in range(min(shallow, n) + 1):
+        if generation:
+            string = rewrite_generation(string, rules)
+        lines = lsys_to_lines(string, angle, 10, angle_offset, **turtle)
+        x1, y1, x2, y2 = lines.bounds() if lines else (0.0, 0.0, 0.0, 0.0)
+        drawings.append((len(lines), max(x2 - x1, y2 - y1)))
+
+    depth = len(drawings) - 1
+    unique, extent = drawings[-1]
+    # every run of F or G draws one segment, before duplicates are dropped
+    drawn = sum(1 for symbol, _ in groupby(string) if symbol in "FG")
+    if drawn and unique < min_unique_ratio * drawn:
+        return f"mostly retraces itself ({unique} unique of {drawn} segments at N={depth})"
+    (_, before), (previous, previous_extent) = drawings[-3:-1]
+    # a hair of tolerance, for float noise in the extents
+    if extent <= previous_extent * (1 + 1e-9) and previous_extent <= before * (1 + 1e-9) and unique < 2 * previous:
+        return f"stops growing after N={depth - 2} (extent {extent:.0f}, {unique} segments at N={depth})"
+    return None
 
 
 def cleanse_rule(rule_string: str) -> str:
@@ -374,12 +828,12 @@ def set_axiom(length: int) -> str:
 def generate_filename(rules_dict: dict[str, Any]) -> str:
     """return a string which can be used as a filename"""
     # rules is a dictionary, expand it to a string
-    # print the length of the dictionary
-    print(f"Length of rules_dict: {len(rules_dict)}")
+    # log the length of the dictionary
+    LOGGER.debug("Length of rules_dict: %d", len(rules_dict))
     rule_string = ""
     for key, value in rules_dict.items():
         val_str = "".join(value) if isinstance(value, list) else str(value)
-        print(f"{key}-->{val_str}")
+        LOGGER.debug("%s-->%s", key, val_str)
         rule_string += f"{key}→{val_str},"
         # strip final comma, and return
     rule_string = rule_string.rstrip(",")
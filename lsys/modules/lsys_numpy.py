@@ -0,0 +1,349 @@
+"""NumPy turtle interpreter, an optional backend for lsys.lsys_to_lines"""
+
+from array import array
+from collections.abc import Iterable
+from itertools import chain, groupby
+
+from .lsys import heading_steps, heading_table
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; callers fall back to lsys.lsys_to_lines
+    np = None
+
+
+def available() -> bool:
+    """return True if NumPy could be imported"""
+    return np is not None
+
+
+def compile_segment_table(
+    lsys: str | Iterable[str],
+    angle: float,
+    length: float,
+    angle_offset: float,
+    weight: float = 1.0,
+    scale: float = 1.2,
+    angle_increment: float = 15.0,
+    weight_increment: float = 1.0,
+) -> tuple[array, array, array, array, array]:
+    """
+    Walks the symbol stream once, recording every move without any trig.
+
+    Each F/G run or f becomes one row of the table: its heading (degrees),
+    distance, line weight, whether it draws, and its parent, the index of the
+    move whose end point it starts from (-1 for the origin). `[` and `]` only
+    save and restore the parent index, so positions can be resolved later as
+    sums along the parent chain.
+
+    Returns:
+    tuple: (headings, distances, weights, draws, parents) as arrays.
+    """
+    headings = array("d")
+    distances = array("d")
+    weights = array("d")
+    draws = array("b")
+    parents = array("q")
+    stack = []
+    current = -1
+    rotation_direction = 1
+
+    # quantised angles are tracked as integer steps, as in lsys_to_lines,
+    # and recorded as exact multiples of the step angle
+    steps = heading_steps(angle, angle_offset, angle_increment)
+    if steps is not None:
+        unit = 360 / steps
+        angle, angle_offset, angle_increment = (round(a / unit) for a in (angle, angle_offset, angle_increment))
+        half_turn = steps // 2
+
+        def degrees(heading):
+            return (heading % steps) * unit
+    else:
+        half_turn = 180
+
+        def degrees(heading):
+            return heading
+
+    symbols = lsys if isinstance(lsys, str) else chain.from_iterable(lsys)
+    for c, run in groupby(symbols):
+        if c in ("F", "G"):
+            count = sum(1 for _ in run)
+            headings.append(degrees(angle))
+            distances.append(length * count)
+            weights.append(weight)
+            draws.append(1)
+            parents.append(current)
+            current = len(parents) - 1
+            continue
+        for _ in run:
+            if c == "f":
+                headings.append(degrees(angle))
+                distances.append(length)
+                weights.append(weight)
+                draws.append(0)
+                parents.append(current)
+                current = len(parents) - 1
+            elif c == "+":
+                angle += angle_offset * rotation_direction
+            elif c == "-":
+                angle += angle_offset * -rotation_direction
+            elif c == "|":
+                angle += half_turn
+            elif c == "[":
+                stack.append((current, angle, angle_offset, length, weight, rotation_direction))
+            elif c == "]":
+                if stack:
+                    current, angle, angle_offset, length, weight, rotation_direction = stack.pop()
+            elif c == "#":
+                weight += weight_increment
+            elif c == "!":
+                weight -= weight_increment
+            elif c == ">":
+                length *= scale
+            elif c == "<":
+                length /= scale
+            elif c == "&":
+                rotation_direction = -rotation_direction
+            elif c == "(":
+                angle_offset += angle_increment
+            elif c == ")":
+                angle_offset -= angle_increment
+
+    return headings, distances, weights, draws, parents
+
+
+def resolve_segments(
+    headings: array, distances: array, weights: array, draws: array, parents: array
+) -> "np.ndarray":
+    """
+    Turns a compiled segment table into an (N, 5) array of x1, y1, x2, y2, w.
+
+    Move vectors are computed in one vectorised pass; end points are then the
+    sum of each move's vector and all of its ancestors', found by pointer
+    jumping (log2 of the deepest chain passes rather than one per move).
+    """
+    theta = np.radians(np.frombuffer(headings, dtype=np.float64))
+    distance = np.frombuffer(distances, dtype=np.float64)
+    end_x = -distance * np.cos(theta)
+    end_y = -distance * np.sin(theta)
+
+    parent = np.frombuffer(parents, dtype=np.int64).copy()
+    ancestor = parent.copy()
+    linked = np.flatnonzero(ancestor >= 0)
+    while linked.size:
+        up = ancestor[linked]
+        end_x[linked] += end_x[up]
+        end_y[linked] += end_y[up]
+        ancestor[linked] = ancestor[up]
+        linked = linked[ancestor[linked] >= 0]
+
+    start_x = np.zeros_like(end_x)
+    start_y = np.zeros_like(end_y)
+    has_parent = parent >= 0
+    start_x[has_parent] = end_x[parent[has_parent]]
+    start_y[has_parent] = end_y[parent[has_parent]]
+
+    drawn = np.frombuffer(draws, dtype=np.int8).astype(bool)
+    return np.column_stack(
+        (
+            start_x[drawn],
+            start_y[drawn],
+            end_x[drawn],
+            end_y[drawn],
+            np.frombuffer(weights, dtype=np.float64)[drawn],
+        )
+    )
+
+
+# significant bits kept by snap, about 10 decimal digits
+SNAP_BITS = 33
+
+# symbols whose effect depends on turtle state (offset changes, direction
+# flips), which the vectorised string path cannot express as sums
+_SEQUENTIAL_SYMBOLS = "&()"
+
+# symbols that change turtle state, other than F/G runs
+_STATE_SYMBOLS = b"f+-|[]#!<>"
+
+
+def _scope_order(codes: "np.ndarray") -> tuple | None:
+    """
+    Pairs up `[` and `]` for scoped_cumsum.
+
+    Symbols are stably sorted by bracket depth, with each `[` keyed by the
+    depth it opens. Within one depth the symbols stay in string order, so a
+    `]` matches the nearest preceding `[` of its block. Returns None when a
+    `]` has no matching `[`.
+    """
+    opens = codes == ord("[")
+    closes = codes == ord("]")
+    step = opens.astype(np.int32) - closes
+    depth = np.cumsum(step)
+    if depth.min() < 0:
+        return None
+    key = depth - step + opens
+    if key.max() < 2**15:
+        key = key.astype(np.int16)  # small ints sort with a radix sort
+    order = np.argsort(key, kind="stable")
+    last_open = np.maximum.accumulate(np.where(opens[order], np.arange(order.size), -1))
+    close_pos = np.flatnonzero(closes[order])
+    return order, close_pos, last_open[close_pos], order[close_pos]
+
+
+def scoped_cumsum(delta: "np.ndarray", scope: tuple) -> "np.ndarray":
+    """
+    Cumulative sum of delta along the string, restored at every `]`.
+
+    Each `]` is given the negated sum of the deltas inside its bracket pair
+    at the pair's own depth (deeper pairs already cancel themselves), which
+    is exactly what popping the turtle stack does.
+    """
+    order, close_pos, open_pos, close_idx = scope
+    prefix = np.cumsum(delta[order], axis=0)
+    delta = delta.copy()
+    delta[close_idx] = prefix[open_pos] - prefix[close_pos]
+    return np.cumsum(delta, axis=0)
+
+
+def string_to_segments(
+    lsys: str,
+    angle: float,
+    length: float,
+    angle_offset: float,
+    weight: float = 1.0,
+    scale: float = 1.2,
+    angle_increment: float = 15.0,
+    weight_increment: float = 1.0,
+) -> "np.ndarray | None":
+    """
+    Fully vectorised interpretation of an L-System string.
+
+    Turns, flips, weight and length changes become integer deltas whose
+    scoped cumulative sums give the turtle state at every move; the move
+    vectors are then summed the same way to give positions. Returns None when
+    the string needs the sequential interpreter (an unmatched `]`, or any of
+    `&`, `(`, `)`).
+    """
+    if any(c in lsys for c in _SEQUENTIAL_SYMBOLS):
+        return None
+    codes = np.frombuffer(lsys.encode("utf-8"), dtype=np.uint8)
+    if not codes.size:
+        return np.empty((0, 5))
+
+    # collapse F/G runs to their first symbol and drop symbols with no effect
+    run_starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+    run_lengths = np.diff(np.append(run_starts, codes.size))
+    draw_runs = (codes[run_starts] == ord("F")) | (codes[run_starts] == ord("G"))
+    counts = np.ones(codes.size, dtype=np.int64)
+    counts[run_starts[draw_runs]] = run_lengths[draw_runs]
+    keep = np.isin(codes, np.frombuffer(_STATE_SYMBOLS, dtype=np.uint8))
+    keep[run_starts[draw_runs]] = True
+    kept = np.flatnonzero(keep)
+    codes = codes[kept]
+    counts = counts[kept]
+
+    scope = _scope_order(codes)
+    if scope is None:
+        return None
+
+    # integer state channels (turns, flips, weight steps, length steps),
+    # skipping any whose symbols never appear
+    moves = np.flatnonzero((codes == ord("F")) | (codes == ord("G")) | (codes == ord("f")))
+    state = {}
+    for channel, up, down in (("turns", "+", "-"), ("flips", "|", ""), ("weights", "#", "!"), ("steps", ">", "<")):
+        if up not in lsys and (not down or down not in lsys):
+            state[channel] = np.zeros(moves.size, dtype=np.int64)
+            continue
+        delta = (codes == ord(up)).astype(np.int64)
+        if down:
+            delta -= codes == ord(down)
+        state[channel] = scoped_cumsum(delta, scope)[moves]
+
+    steps = heading_steps(angle, angle_offset, angle_increment)
+    if steps is not None:
+        # quantised angles: integer heading indices into a unit vector table
+        unit = 360 / steps
+        heading = round(angle / unit) + round(angle_offset / unit) * state["turns"]
+        heading = (heading + steps // 2 * state["flips"]) % steps
+        unit_x, unit_y = np.array(heading_table(steps))[heading].T
+    else:
+        theta = np.radians(angle + angle_offset * state["turns"] + 180.0 * state["flips"])
+        unit_x, unit_y = np.cos(theta), np.sin(theta)
+    distance = length * np.power(scale, state["steps"].astype(np.float64)) * counts[moves]
+
+    vectors = np.zeros((codes.size, 2))
+    vectors[moves, 0] = -distance * unit_x
+    vectors[moves, 1] = -distance * unit_y
+    ends = scoped_cumsum(vectors, scope)[moves]
+    starts = ends - vectors[moves]
+
+    drawn = codes[moves] != ord("f")
+    return np.column_stack(
+        (
+            starts[drawn],
+            ends[drawn],
+            weight + weight_increment * state["weights"][drawn].astype(np.float64),
+        )
+    )
+
+
+def snap(segments: "np.ndarray", bits: int = SNAP_BITS) -> "np.ndarray":
+    """
+    Round each segment's coordinates to a number of significant bits of
+    its largest coordinate.
+
+    Points reached along different branches accumulate rounding error in a
+    different order, so without this the same segment can survive
+    deduplication as several near-identical rows. Each segment is rounded
+    on its own scale, not the whole drawing's, so small segments in a
+    drawing spanning many orders of magnitude aren't merged.
+    """
+    if not segments.size:
+        return segments
+    coordinates = segments[:, :4]
+    _, exponent = np.frexp(np.abs(coordinates).max(axis=1, keepdims=True))
+    segments[:, :4] = np.ldexp(np.round(np.ldexp(coordinates, bits - exponent)), exponent - bits)
+    # adding 0.0 turns -0.0 into 0.0, so equal rows have equal bytes
+    return segments + 0.0
+
+
+def unique_rows(segments: "np.ndarray") -> "np.ndarray":
+    """drop duplicate rows, comparing each row's bytes (much faster than axis=0)"""
+    rows = np.ascontiguousarray(segments, dtype=np.float64)
+    unique = np.unique(rows.view(np.dtype((np.void, rows.itemsize * rows.shape[1]))).ravel())
+    return unique.view(np.float64).reshape(-1, rows.shape[1])
+
+
+def lsys_to_segments(
+    lsys: str | Iterable[str],
+    angle: float,
+    length: float,
+    angle_offset: float,
+    weight: float = 1.0,
+    scale: float = 1.2,
+    angle_increment: float = 15.0,
+    weight_increment: float = 1.0,
+) -> "np.ndarray":
+    """
+    NumPy equivalent of lsys.lsys_to_lines.
+
+    Takes the same parameters, and returns the unique segments as an (N, 5)
+    float array of x1, y1, x2, y2, w. Strings are interpreted entirely with
+    array operations where possible; chunk streams and strings using the
+    sequential symbols go through a compiled segment table instead.
+    Coordinates match lsys_to_lines to within floating point rounding, as
+    sums are accumulated in a different order.
+    """
+    if np is None:
+        raise ImportError("NumPy is required for the numpy backend")
+    segments = None
+    if isinstance(lsys, str):
+        segments = string_to_segments(
+            lsys, angle, length, angle_offset, weight, scale, angle_increment, weight_increment
+        )
+    if segments is None:
+        table = compile_segment_table(
+            lsys, angle, length, angle_offset, weight, scale, angle_increment, weight_increment
+        )
+        segments = resolve_segments(*table)
+    return unique_rows(snap(segments))
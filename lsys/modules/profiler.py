@@ -0,0 +1,175 @@
+"""
+Per-stage timers, memory peaks and element counts for a run of the pipeline,
+and exports of whole-run cProfile statistics
+"""
+
+import json
+import pstats
+import time
+import tracemalloc
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+
+class Profiler:
+    """
+    Times named stages, with their tracemalloc peaks, and keeps element counts.
+
+    While disabled, stage() and count() do nothing, so the pipeline can wrap
+    its stages unconditionally. Once started, each stage records its calls,
+    wall time and, when tracing memory, the peak traced memory above what
+    was allocated when it began; a stage run more than once (random retries,
+    weight groups) sums its calls and time and keeps its largest peak.
+    Stages must not nest, as each one resets the traced peak. tracemalloc
+    slows allocation heavy stages (the interpreter most of all) several
+    times over, so start(memory=False) for timings alone.
+
+    record() gives the results as a dict, merge() adds in another process's
+    record, report() formats a table and append_json() adds the record to a
+    JSON lines file.
+    """
+
+    def __init__(self, enabled: bool = False, memory: bool = True) -> None:
+        self.enabled = enabled
+        self.memory = memory
+        self.stages: dict[str, dict[str, float]] = {}
+        self.counts: dict[str, int] = {}
+        self.started = None
+
+    def start(self, memory: bool = True) -> None:
+        """enable the profiler, tracing allocations if memory is set"""
+        self.enabled = True
+        self.memory = memory
+        self.started = time.perf_counter()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def reset(self) -> None:
+        """forget stages and counts recorded so far"""
+        self.stages = {}
+        self.counts = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """time the body of the with block as stage name"""
+        if not self.enabled:
+            yield
+            return
+        if self.memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - before if self.memory else 0
+            entry = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0, "peak_mb": 0.0})
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            entry["peak_mb"] = max(entry["peak_mb"], peak / 1e6)
+
+    def count(self, name: str, value: int) -> None:
+        """set the element count name (the last value set is kept)"""
+        if self.enabled:
+            self.counts[name] = value
+
+    def record(self) -> dict[str, Any]:
+        """the stages and counts, with the total time since start"""
+        total = time.perf_counter() - self.started if self.started is not None else 0.0
+        return {"seconds": total, "memory": self.memory, "stages": self.stages, "counts": self.counts}
+
+    def merge(self, record: dict[str, Any] | None) -> None:
+        """add stages and counts from another process's record"""
+        if not record:
+            return
+        for name, other in record["stages"].items():
+            entry = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0, "peak_mb": 0.0})
+            entry["calls"] += other["calls"]
+            entry["seconds"] += other["seconds"]
+            entry["peak_mb"] = max(entry["peak_mb"], other["peak_mb"])
+        for name, value in record["counts"].items():
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def report(self) -> str:
+        record = self.record()
+        staged = sum(entry["seconds"] for entry in self.stages.values())
+        # stages merged from worker processes can add up to more than the wall time
+        whole = max(record["seconds"], staged)
+        peak = f"{'peak MB':>10}" if self.memory else ""
+        rows = [f"{'stage':<12}{'calls':>7}{'seconds':>10}{'share':>8}{peak}"]
+        for name, entry in self.stages.items():
+            share = entry["seconds"] / whole if whole else 0.0
+            peak = f"{entry['peak_mb']:>10.2f}" if self.memory else ""
+            rows.append(f"{name:<12}{entry['calls']:>7}{entry['seconds']:>10.4f}{share:>8.0%}{peak}")
+        rows.append(f"{'other':<12}{'':>7}{whole - staged:>10.4f}")
+        rows.append(f"{'total':<12}{'':>7}{record['seconds']:>10.4f}")
+        rows.extend(f"{name}: {value:,}" for name, value in self.counts.items())
+        traced = " (times include tracemalloc overhead)" if self.memory else ""
+        return f"Profile{traced}:\n" + "\n".join(f"  {row}" for row in rows)
+
+    def append_json(self, path: str | Path, **extra: Any) -> None:
+        """append the record, with any extra fields, as one line of JSON to path"""
+        with Path(path).open("a", encoding="utf-8") as file:
+            file.write(json.dumps({**extra, **self.record()}, default=str) + "\n")
+
+
+def frame_label(function: tuple[str, int, str]) -> str:
+    """name a pstats function key as function (file:line), or builtins by name"""
+    filename, line, name = function
+    if filename == "~":
+        return name
+    return f"{name} ({Path(filename).name}:{line})"
+
+
+def collapsed_stacks(stats: pstats.Stats, max_depth: int = 64, max_stacks: int = 10000) -> Iterator[str]:
+    """
+    yield "root;caller;callee microseconds" lines, the collapsed stack format
+    flamegraph tools read, from cProfile statistics.
+
+    cProfile keeps only caller/callee pairs, so stacks are rebuilt by walking
+    down from the functions nothing called: each call edge's share of the
+    callee's cumulative time is followed, and a function's own time is
+    emitted at the end of every stack that reaches it, in proportion. A
+    function called from several places splits its callees between them by
+    that proportion too, and recursive calls are folded into the first frame.
+
+    A call graph can have exponentially many paths, so the walk stops going
+    deeper once a stack would be max_depth frames, its share is under half
+    a microsecond, or max_stacks stacks have been made. The callee time it
+    skips is added to the deepest frame reached, so the totals still add up
+    """
+    entries = stats.stats  # type: ignore[attr-defined]
+    callees = defaultdict(list)
+    for function, (_, _, _, _, callers) in entries.items():
+        for caller, (_, _, _, cumulative) in callers.items():
+            callees[caller].append((function, cumulative))
+    folded = defaultdict(float)
+
+    def walk(function, stack, seconds):
+        _, _, own, cumulative, _ = entries[function]
+        share = seconds / cumulative if cumulative else 0.0
+        key = ";".join(stack)
+        folded[key] += own * share
+        for callee, edge in callees[function]:
+            if callee in stack_functions:
+                continue
+            if len(stack) >= max_depth or edge * share < 5e-7 or len(folded) >= max_stacks:
+                folded[key] += edge * share
+                continue
+            stack_functions.add(callee)
+            walk(callee, stack + [frame_label(callee)], edge * share)
+            stack_functions.discard(callee)
+
+    for function, (_, _, _, cumulative, callers) in entries.items():
+        if not callers:
+            stack_functions = {function}
+            walk(function, [frame_label(function)], cumulative)
+    for stack, seconds in folded.items():
+        microseconds = round(seconds * 1e6)
+        if microseconds:
+            yield f"{stack} {microseconds}"
@@ -0,0 +1,164 @@
+"""
+Raster previews: draws a segment buffer into a greyscale framebuffer and
+writes it as a PNG, with NumPy if it is installed
+"""
+
+import struct
+import zlib
+from collections.abc import Iterable, Sequence
+from pathlib import Path
+
+from .segments import FIELDS, SegmentBuffer
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the bytearray rasteriser is used instead
+    np = None
+
+# grey levels for the named colours the config uses
+NAMED_GREYS = {"white": 255, "black": 0}
+
+
+def grey(colour: str, default: int) -> int:
+    """the luma (0-255) of a #rgb / #rrggbb or named colour, or default"""
+    colour = colour.strip().lower()
+    if colour in NAMED_GREYS:
+        return NAMED_GREYS[colour]
+    if colour.startswith("#") and len(colour) in (4, 7):
+        digits = colour[1:]
+        if len(digits) == 3:
+            digits = "".join(digit * 2 for digit in digits)
+        try:
+            red, green, blue = (int(digits[i : i + 2], 16) for i in (0, 2, 4))
+        except ValueError:
+            return default
+        return round(0.299 * red + 0.587 * green + 0.114 * blue)
+    return default
+
+
+def pixel_segments(lines: SegmentBuffer, factor: float, width: int, height: int) -> set[tuple[int, ...]]:
+    """
+    the distinct segments in pixels, as (x1, y1, x2, y2, stroke) ints with
+    the end points clamped to the canvas. Strokes are at least a pixel wide.
+    At thumbnail sizes most segments land on a handful of pixels, so this
+    is where the drawing stops depending on the segment count. Segments are
+    not reordered: the pipeline has already normalised their directions
+    """
+    data = lines.data
+    columns = [
+        [min(max(int(value * factor), 0), limit) for value in data[column::FIELDS]]
+        for column, limit in enumerate((width - 1, height - 1, width - 1, height - 1))
+    ]
+    strokes = [max(1, round(weight * factor)) for weight in data[4::FIELDS]]
+    return set(zip(*columns, strokes))
+
+
+def line_points(x1: int, y1: int, x2: int, y2: int) -> Iterable[tuple[int, int]]:
+    """
+    the pixels Bresenham's algorithm visits from (x1, y1) to (x2, y2): one per
+    step along the major axis, at the nearest pixel on the minor axis. Each
+    step is worked out on its own, as the NumPy rasteriser does for all of
+    them at once, so both draw the same pixels
+    """
+    dx, dy = x2 - x1, y2 - y1
+    steps = max(abs(dx), abs(dy))
+    span = 2 * max(steps, 1)
+    return ((x1 + (2 * dx * i + span // 2) // span, y1 + (2 * dy * i + span // 2) // span) for i in range(steps + 1))
+
+
+def rasterise(
+    lines: SegmentBuffer,
+    image_size: Sequence[float],
+    width: int,
+    background: int = 255,
+    ink: int = 0,
+) -> tuple[int, int, bytes]:
+    """
+    Draw lines, in image_size coordinates, onto a greyscale canvas width
+    pixels wide, keeping the aspect ratio. Each segment is drawn as its
+    Bresenham line stamped with a square brush its stroke-width wide (scaled
+    to the canvas, and at least one pixel), like the svg's square line caps.
+
+    Returns:
+    tuple: (width, height, pixels), one byte per pixel, row by row.
+    """
+    factor = width / image_size[0]
+    height = max(1, round(image_size[1] * factor))
+    if np is not None:
+        return width, height, _rasterise_numpy(lines, factor, width, height, background, ink)
+
+    # the distinct pixels each stroke width covers
+    by_stroke: dict[int, set[int]] = {}
+    for x1, y1, x2, y2, stroke in pixel_segments(lines, factor, width, height):
+        pixels = by_stroke.setdefault(stroke, set())
+        pixels.update(y * width + x for x, y in line_points(x1, y1, x2, y2))
+
+    canvas = bytearray([background]) * (width * height)
+    for stroke, pixels in by_stroke.items():
+        if stroke == 1:
+            for pixel in pixels:
+                canvas[pixel] = ink
+            continue
+        low = -(stroke // 2)
+        run = bytes([ink]) * stroke
+        for pixel in pixels:
+            y, x = divmod(pixel, width)
+            left, right = max(x + low, 0), min(x + low + stroke, width)
+            for row in range(max(y + low, 0), min(y + low + stroke, height)):
+                canvas[row * width + left : row * width + right] = run[: right - left]
+    return width, height, bytes(canvas)
+
+
+def _rasterise_numpy(lines: SegmentBuffer, factor: float, width: int, height: int, background: int, ink: int) -> bytes:
+    canvas = np.full((height, width), background, dtype=np.uint8)
+    if not lines:
+        return canvas.tobytes()
+    # pixel_segments, for the whole buffer at once
+    data = np.frombuffer(lines.data, dtype=np.float64).reshape(-1, FIELDS)
+    x1, y1, x2, y2 = np.clip((data[:, :4] * factor).astype(np.int64), 0, [width - 1, height - 1] * 2).T
+    strokes = np.maximum(np.rint(data[:, 4] * factor), 1).astype(np.int64)
+    # pack each segment into one integer, as np.unique sorts rows far slower
+    keys = np.unique((((x1 * height + y1) * width + x2) * height + y2) * (strokes.max() + 1) + strokes)
+    keys, strokes = np.divmod(keys, strokes.max() + 1)
+    keys, y2 = np.divmod(keys, height)
+    keys, x2 = np.divmod(keys, width)
+    x1, y1 = np.divmod(keys, height)
+    segments = x1, y1, x2, y2
+    for stroke in np.unique(strokes):
+        x1, y1, x2, y2 = (column[strokes == stroke] for column in segments)
+        dx, dy = x2 - x1, y2 - y1
+        steps = np.maximum(np.abs(dx), np.abs(dy))
+        # one row per Bresenham step: its segment, and how far along it is
+        owner = np.repeat(np.arange(len(steps)), steps + 1)
+        i = np.arange(len(owner)) - np.repeat(np.cumsum(steps + 1) - (steps + 1), steps + 1)
+        span = 2 * np.maximum(steps, 1)[owner]
+        xs = x1[owner] + (2 * dx[owner] * i + span // 2) // span
+        ys = y1[owner] + (2 * dy[owner] * i + span // 2) // span
+        ys, xs = np.divmod(np.unique(ys * width + xs), width)
+        low = -(int(stroke) // 2)
+        for row in range(low, low + int(stroke)):
+            for column in range(low, low + int(stroke)):
+                y, x = ys + row, xs + column
+                inside = (y >= 0) & (y < height) & (x >= 0) & (x < width)
+                canvas[y[inside], x[inside]] = ink
+    return canvas.tobytes()
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def write_png(path: str | Path, width: int, height: int, pixels: bytes, transparent: int | None = None) -> int:
+    """
+    write greyscale pixels (one byte each, row by row) as an 8-bit PNG,
+    with the grey level transparent (if given) marked see-through. Returns
+    the bytes written
+    """
+    # each row starts with its filter type, 0 (none)
+    rows = b"".join(b"\x00" + pixels[row * width : (row + 1) * width] for row in range(height))
+    png = b"\x89PNG\r\n\x1a\n" + _chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+    if transparent is not None:
+        png += _chunk(b"tRNS", struct.pack(">H", transparent))
+    png += _chunk(b"IDAT", zlib.compress(rows)) + _chunk(b"IEND", b"")
+    Path(path).write_bytes(png)
+    return len(png)
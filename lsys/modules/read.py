@@ -35,6 +35,7 @@ def build_commandline(filepath: str) -> str:
     # INITIAL_ANGLE -> --initial-angle
     # ROTATE_ANGLE -> --rotation
     # PARADIGM -> --paradigm
+    # BUDGET -> --max-segments / --max-memory-mb / --max-seconds
     
     cli_args = []
     
@@ -49,5 +50,8 @@ def build_commandline(filepath: str) -> str:
         cli_args.append(f"--initial-angle {params['INITIAL_ANGLE']}")
     if "ROTATE_ANGLE" in params:
         cli_args.append(f"--rotation {params['ROTATE_ANGLE']}")
+    if "BUDGET" in params:
+        # already in flag form, e.g. --max-segments 1000000
+        cli_args.append(params["BUDGET"])
         
     return " ".join(cli_args)
@@ -0,0 +1,236 @@
+"""
+Compact segment storage
+"""
+
+from array import array
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+Line = tuple[tuple[float, float], tuple[float, float], float]
+
+# doubles stored per segment: x1, y1, x2, y2, weight
+FIELDS = 5
+
+# segments transform works through at a time, bounding its scratch memory
+BLOCK = 4096
+
+
+def _rounded(values: Iterable[float], precision: int) -> tuple[float, ...]:
+    """round values as SegmentBuffer.round does"""
+    if precision <= 0:
+        return tuple(round(v) + 0.0 for v in values)
+    return tuple(round(v, precision) + 0.0 for v in values)
+
+
+class SegmentBuffer:
+    """
+    A flat array('d') of segments, five doubles (x1, y1, x2, y2, w) each.
+
+    Stages transform the buffer in place rather than rebuilding nested tuples,
+    so a segment costs 40 bytes instead of several Python objects. Iterating
+    (or indexing) still yields ((x1, y1), (x2, y2), w) tuples, so code written
+    against the old line sets keeps working.
+
+    copies counts how many times the segments were copied into a new buffer
+    on the way through the pipeline; precision records the rounding applied,
+    so that coordinates rounded to 0 places are handed out as ints. box is
+    the (min_x, min_y, max_x, max_y) bounding box when the producer tracked
+    it (see lsys.lsys_to_lines), kept up to date by the methods below, or
+    None if bounds has to scan the points.
+    """
+
+    __slots__ = ("data", "copies", "precision", "box")
+
+    def __init__(
+        self,
+        data: array | None = None,
+        copies: int = 0,
+        precision: int | None = None,
+        box: tuple[float, float, float, float] | None = None,
+    ) -> None:
+        self.data = array("d") if data is None else data
+        self.copies = copies
+        self.precision = precision
+        self.box = box
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[Line], copies: int = 0) -> "SegmentBuffer":
+        """build a buffer from ((x1, y1), (x2, y2), w) tuples"""
+        buffer = cls(copies=copies)
+        extend = buffer.data.extend
+        for (x1, y1), (x2, y2), w in lines:
+            extend((x1, y1, x2, y2, w))
+        return buffer
+
+    @classmethod
+    def from_array(cls, segments: Any) -> "SegmentBuffer":
+        """build a buffer from an (N, 5) NumPy array without per-segment objects"""
+        data = array("d")
+        data.frombytes(segments.astype("float64", order="C", copy=False).tobytes())
+        return cls(data)
+
+    def derive(self, lines: Iterable[Line]) -> "SegmentBuffer":
+        """
+        build a new buffer from lines produced by a stage, counting the copy.
+        the stage must keep the drawing's extent (as clipping, merging and
+        reordering do), since the bounding box is carried over
+        """
+        buffer = SegmentBuffer.from_lines(lines, copies=self.copies + 1)
+        buffer.precision = self.precision
+        buffer.box = self.box
+        return buffer
+
+    def append(self, x1: float, y1: float, x2: float, y2: float, w: float) -> None:
+        """add one segment"""
+        self.data.extend((x1, y1, x2, y2, w))
+        self.box = None
+
+    def __len__(self) -> int:
+        return len(self.data) // FIELDS
+
+    def __bool__(self) -> bool:
+        return bool(self.data)
+
+    def _line(self, i: int) -> Line:
+        x1, y1, x2, y2, w = self.data[i : i + FIELDS]
+        if self.precision is not None and self.precision <= 0:
+            x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+        return ((x1, y1), (x2, y2), int(w) if w.is_integer() else w)
+
+    def __getitem__(self, index: int) -> Line:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("segment index out of range")
+        return self._line(index * FIELDS)
+
+    def __iter__(self) -> Iterator[Line]:
+        for i in range(0, len(self.data), FIELDS):
+            yield self._line(i)
+
+    @property
+    def nbytes(self) -> int:
+        """bytes used by the segment data"""
+        return len(self.data) * self.data.itemsize
+
+    def bounds(self) -> tuple[float, float, float, float]:
+        """
+        return min_x, min_y, max_x, max_y over every end point: the tracked
+        box if there is one, or else one pass over the buffer, BLOCK
+        segments at a time, so no full column is ever copied
+        """
+        if self.box is not None:
+            return self.box
+        data = self.data
+        min_x = min_y = float("inf")
+        max_x = max_y = float("-inf")
+        for start in range(0, len(data), BLOCK * FIELDS):
+            end = min(start + BLOCK * FIELDS, len(data))
+            x1, y1, x2, y2 = (data[start + column : end : FIELDS] for column in range(4))
+            min_x, max_x = min(min_x, min(x1), min(x2)), max(max_x, max(x1), max(x2))
+            min_y, max_y = min(min_y, min(y1), min(y2)), max(max_y, max(y1), max(y2))
+        return min_x, min_y, max_x, max_y
+
+    def transform(
+        self,
+        scale: float,
+        x_offset: float,
+        y_offset: float,
+        origin: tuple[float, float] = (0.0, 0.0),
+        precision: int | None = None,
+    ) -> None:
+        """
+        map every point (x, y) to ((x - ox) * scale + x_offset,
+        (y - oy) * scale + y_offset) in place, rounding to precision places
+        in the same pass when given. Measuring from an origin near the
+        points (such as the bounding box corner) keeps large coordinates
+        from cancelling. BLOCK segments are done at a time, so the scratch
+        space is bounded however many segments there are.
+        """
+        data = self.data
+        ox, oy = origin
+        for start in range(0, len(data), BLOCK * FIELDS):
+            end = min(start + BLOCK * FIELDS, len(data))
+            for column, o, offset in ((0, ox, x_offset), (1, oy, y_offset), (2, ox, x_offset), (3, oy, y_offset)):
+                values = data[start + column : end : FIELDS]
+                if precision is None:
+                    moved = [(v - o) * scale + offset for v in values]
+                elif precision <= 0:
+                    moved = [round((v - o) * scale + offset) + 0.0 for v in values]
+                else:
+                    moved = [round((v - o) * scale + offset, precision) + 0.0 for v in values]
+                data[start + column : end : FIELDS] = array("d", moved)
+        if self.box is not None and scale > 0:
+            # the map is increasing, so the corners map to the new corners
+            min_x, min_y, max_x, max_y = self.box
+            box = (
+                (min_x - ox) * scale + x_offset,
+                (min_y - oy) * scale + y_offset,
+                (max_x - ox) * scale + x_offset,
+                (max_y - oy) * scale + y_offset,
+            )
+            self.box = box if precision is None else _rounded(box, precision)
+        else:
+            self.box = None
+        if precision is not None:
+            self.precision = precision
+
+    def round(self, precision: int) -> None:
+        """round every coordinate in place, as utils.set_precision does"""
+        data = self.data
+        for column in range(4):
+            # adding 0.0 turns -0.0 into 0.0, so dedupe sees them as equal
+            if precision <= 0:
+                rounded = [round(v) + 0.0 for v in data[column::FIELDS]]
+            else:
+                rounded = [round(v, precision) + 0.0 for v in data[column::FIELDS]]
+            data[column::FIELDS] = array("d", rounded)
+        if self.box is not None:
+            # rounding never reorders values, so the rounded box is exact
+            self.box = _rounded(self.box, precision)
+        self.precision = precision
+
+    def normalise(self) -> None:
+        """orient every segment so its start point sorts before its end point"""
+        data = self.data
+        x1, y1, x2, y2 = (data[column::FIELDS] for column in range(4))
+        flipped = [(b, d) < (a, c) for a, c, b, d in zip(x1, y1, x2, y2)]
+        if not any(flipped):
+            return
+        data[0::FIELDS] = array("d", [b if f else a for f, a, b in zip(flipped, x1, x2)])
+        data[1::FIELDS] = array("d", [b if f else a for f, a, b in zip(flipped, y1, y2)])
+        data[2::FIELDS] = array("d", [a if f else b for f, a, b in zip(flipped, x1, x2)])
+        data[3::FIELDS] = array("d", [a if f else b for f, a, b in zip(flipped, y1, y2)])
+
+    def dedupe(self) -> None:
+        """drop repeated segments in place, keeping the first of each"""
+        data = self.data
+        raw = memoryview(data).cast("B")
+        width = FIELDS * data.itemsize
+        seen = set()
+        write = 0
+        for read in range(0, len(data), FIELDS):
+            key = raw[read * data.itemsize : read * data.itemsize + width].tobytes()
+            if key in seen:
+                continue
+            seen.add(key)
+            if write != read:
+                data[write : write + FIELDS] = data[read : read + FIELDS]
+            write += FIELDS
+        raw.release()
+        del data[write:]
+
+    def group_by_weight(self) -> dict[float, "SegmentBuffer"]:
+        """split into one buffer per line weight, in order of first appearance"""
+        groups: dict[float, SegmentBuffer] = {}
+        data = self.data
+        for i in range(0, len(data), FIELDS):
+            group = groups.get(data[i + 4])
+            if group is None:
+                group = groups[data[i + 4]] = SegmentBuffer(copies=self.copies + 1, precision=self.precision)
+            group.data.extend(data[i : i + FIELDS])
+        return groups
+
+    def report(self) -> str:
+        """summarise size, memory footprint and copies"""
+        return f"Segments: {len(self)} ({self.nbytes / 1e6:.2f}MB, {self.copies} copies)"
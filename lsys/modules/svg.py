@@ -6,10 +6,18 @@ SVG functions
 """
 
 import sys
-from collections.abc import Mapping, Sequence
-from typing import Any
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from contextlib import contextmanager
+from itertools import chain, islice
+from operator import sub
+from typing import Any, TextIO
 from pathlib import Path
 from modules import utils
+from modules.log import LOGGER
+from modules.segments import FIELDS, SegmentBuffer
+
+# segments formatted per batch when emitting lines and paths
+BATCH_SIZE = 4096
 
 
 def dict_to_tags(tag_dict: str | Mapping[str, object]) -> str:
@@ -17,10 +25,10 @@ def dict_to_tags(tag_dict: str | Mapping[str, object]) -> str:
     # if dict is empty, break with warning
     # if type is string, return it
     if isinstance(tag_dict, str):
-        print("tag_dict is a string, returning it...")
+        LOGGER.debug("tag_dict is a string, returning it...")
         return tag_dict
     if not tag_dict:
-        print("tag_dict is empty, you'll probably have a broken SVG...")
+        LOGGER.warning("tag_dict is empty, you'll probably have a broken SVG...")
         return ""
     return " ".join([f"{key}='{value}'" for key, value in tag_dict.items()])
 
@@ -57,35 +65,81 @@ def svg_footer() -> str:
 # # build SVG file
 
 
-def build_svg_file(paper_size: Sequence[float | int], drawable_area: Sequence[float | int], svg_list: list[str], background: str = "white") -> list[str] | None:
-    """build the SVG file from the following parts:
-    header
-    svg_list
-    footer
+class SvgWriter:
     """
-    # if svg_list is empty, break with warning
-    if not svg_list:
-        print("svg_list is empty, you'll probably have a broken SVG...")
-        return
-    svg_list.insert(0, svg_header(paper_size, drawable_area, background=background))
-    svg_list.append(svg_footer())
-    return svg_list
+    Writes an SVG file element by element, instead of building it in a list.
 
+    The header is written when the writer is opened, and the param comment
+    and footer when it is closed, so only the element being written is held
+    in memory. size counts the bytes written so far (UTF-8), and is reported
+    with utils.human_values on close. Use it as a context manager:
 
-def write_file(filename: str | Path, svg_list: list[str] | None, mini: bool = False) -> None:
-    """Write the SVG file"""
-    # calculate size of output file
-    # if svg_list is empty, break with warning
-    if not svg_list:
-        print("svg_list is empty, you'll probably have a broken SVG...")
-        return
-    utils.calc_output_size(svg_list)
-    with open(filename, "w", encoding="utf-8") as svg_file:
-        for line in svg_list:
-            if mini:
-                svg_file.write(line)
-            else:
-                svg_file.write(line + "\n")
+        with SvgWriter(filename, paper_size, drawable_area, comment=params) as doc:
+            with doc.group(style):
+                doc.write_all(elements)
+    """
+
+    def __init__(
+        self,
+        filename: str | Path,
+        paper_size: Sequence[float | int],
+        drawable_area: Sequence[float | int],
+        background: str = "white",
+        comment: dict[str, Any] | None = None,
+        mini: bool = False,
+    ) -> None:
+        self.filename = filename
+        self.paper_size = paper_size
+        self.drawable_area = drawable_area
+        self.background = background
+        self.comment = comment
+        self.end = "" if mini else "\n"
+        self.size = 0
+        self.file: TextIO | None = None
+
+    def __enter__(self) -> "SvgWriter":
+        self.file = open(self.filename, "w", encoding="utf-8")
+        self.write(svg_header(self.paper_size, self.drawable_area, background=self.background))
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, traceback: Any) -> None:
+        if exc_type is None:
+            self.close()
+        elif self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def write(self, element: str) -> None:
+        """write one element"""
+        if not element:
+            return
+        element += self.end
+        self.file.write(element)
+        self.size += len(element.encode("utf-8"))
+
+    def write_all(self, elements: Iterable[str]) -> None:
+        """write elements as they are generated"""
+        for element in elements:
+            self.write(element)
+
+    @contextmanager
+    def group(self, style: Mapping[str, object] | None = None) -> Iterator["SvgWriter"]:
+        """wrap the elements written inside the with block in a <g> tag"""
+        group_style = dict_to_tags(style) if style else ""
+        self.write(f"<g {group_style}>" if group_style else "<g>")
+        yield self
+        self.write("</g>")
+
+    def close(self) -> None:
+        """write the param comment and footer, then report the file size"""
+        if self.file is None:
+            return
+        if self.comment is not None:
+            self.write(set_comment(self.comment))
+        self.write(svg_footer())
+        self.file.close()
+        self.file = None
+        utils.human_values(self.size)
 
 
 def set_comment(comment_dict: dict[str, Any]) -> str:
@@ -100,18 +154,27 @@ def set_comment(comment_dict: dict[str, Any]) -> str:
     return comment_string
 
 
-def scale_to_fit(object_list: list[tuple[tuple[float, float], tuple[float, float], float]], target_size: Sequence[float | int], bleed: float) -> list[tuple[tuple[float, float], tuple[float, float], float]]:
+def scale_to_fit(
+    object_list: SegmentBuffer | list[tuple[tuple[float, float], tuple[float, float], float]],
+    target_size: Sequence[float | int],
+    bleed: float,
+    precision: int | None = None,
+) -> SegmentBuffer:
     """
     Scale and center a list of line coordinates to fit exactly within
     target_size (width, height) minus bleed on all sides, maintaining aspect ratio.
+    A SegmentBuffer is transformed in place and returned; other line lists
+    are copied into a new buffer first. The bounding box comes from the
+    buffer (tracked by the interpreter where it can be), and the scaling,
+    centring and rounding to precision places (if given) are one pass of
+    SegmentBuffer.transform, measured from the box's corner.
     """
     if not object_list:
         sys.exit("Object list is empty")
+    if not isinstance(object_list, SegmentBuffer):
+        object_list = SegmentBuffer.from_lines(object_list)
 
-    xs = [coord[0] for obj in object_list for coord in (obj[0], obj[1])]
-    ys = [coord[1] for obj in object_list for coord in (obj[0], obj[1])]
-    min_x, max_x = min(xs), max(xs)
-    min_y, max_y = min(ys), max(ys)
+    min_x, min_y, max_x, max_y = object_list.bounds()
 
     width = max_x - min_x
     height = max_y - min_y
@@ -126,35 +189,135 @@ def scale_to_fit(object_list: list[tuple[tuple[float, float], tuple[float, float
     # Calculate uniform scaling factor to fit inside the target area
     scale = min(target_width / width, target_height / height)
 
-    # Calculate the new centered offset
+    # Calculate the new centered offset of the box's corner
     scaled_width = width * scale
     scaled_height = height * scale
 
-    x_offset = bleed + (target_width - scaled_width) / 2.0 - (min_x * scale)
-    y_offset = bleed + (target_height - scaled_height) / 2.0 - (min_y * scale)
+    x_offset = bleed + (target_width - scaled_width) / 2.0
+    y_offset = bleed + (target_height - scaled_height) / 2.0
+
+    object_list.transform(scale, x_offset, y_offset, origin=(min_x, min_y), precision=precision)
+    return object_list
+
+
+def number_format(precision: int) -> str:
+    """return the %-format for a coordinate rounded to precision places"""
+    return "%d" if precision <= 0 else f"%.{precision}f"
 
-    new_object_list = [
-        (
-            (obj[0][0] * scale + x_offset, obj[0][1] * scale + y_offset),
-            (obj[1][0] * scale + x_offset, obj[1][1] * scale + y_offset),
-            obj[2] if len(obj) > 2 else 1.0
-        )
-        for obj in object_list
-    ]
-    return new_object_list
+
+def format_batch(template: str, values: Sequence[float], precision: int, ends: str = "'") -> str:
+    """
+    Fill template's number_format placeholders with values in one call.
+
+    Values should already be rounded to precision, as the drawing stages
+    leave them. Numbers are printed with exactly precision decimals, so
+    trailing zeros can then be stripped with plain replaces before each
+    character in ends (123.50 becomes 123.5, and 123.00 becomes 123), and
+    -0 becomes 0.
+    """
+    text = template % tuple(values)
+    if precision <= 0:
+        return text
+    zero = "0." + "0" * precision
+    for end in ends:
+        text = text.replace(f"-{zero}{end}", f"{zero}{end}")
+        for _ in range(precision):
+            text = text.replace("0" + end, end)
+        text = text.replace("." + end, end)
+    return text
+
+
+def lines(
+    segments: SegmentBuffer | Iterable[tuple[tuple[float, float], tuple[float, float], float]],
+    precision: int,
+    separator: str = "\n",
+) -> Iterator[str]:
+    """
+    Yield <line> elements for segments, BATCH_SIZE at a time.
+
+    Each batch is formatted with a single format_batch call and yielded as
+    one string, its elements joined by separator.
+    """
+    line_template = "<line x1='{0}' y1='{0}' x2='{0}' y2='{0}'/>".format(number_format(precision))
+    if isinstance(segments, SegmentBuffer):
+        data = segments.data
+        step = BATCH_SIZE * FIELDS
+        for i in range(0, len(data), step):
+            values = data[i : i + step]
+            del values[FIELDS - 1 :: FIELDS]
+            yield format_batch(separator.join([line_template] * (len(values) // 4)), values, precision)
+        return
+    segments = iter(segments)
+    while batch := list(islice(segments, BATCH_SIZE)):
+        values = [v for start, end, _ in batch for v in (start[0], start[1], end[0], end[1])]
+        yield format_batch(separator.join([line_template] * len(batch)), values, precision)
+
+
+def path_data(chains: Iterable[Sequence[tuple[float, float]]], precision: int) -> str:
+    """
+    Return compact relative path data for runs of points.
+
+    The first run starts with an absolute moveto, and each later run with a
+    moveto relative to the end of the one before. The points of a run
+    follow as relative lineto offsets after a single "l", as implicit
+    commands ("M10 20l5-5 0 10m20 0l5 5"). Points should already be
+    rounded to precision, so the offsets add up exactly.
+    """
+    number = number_format(precision)
+    pair = f"{number} {number}"
+    parts = []
+    flat: list[float] = []
+    for points in chains:
+        parts.append("m" + pair)
+        if len(points) > 1:
+            parts.append("l" + " ".join([pair] * (len(points) - 1)))
+        flat.extend(chain.from_iterable(points))
+    if not flat:
+        return ""
+    # every offset, including each relative moveto, is the difference
+    # between consecutive points of the runs laid end to end
+    values = flat[:2] + list(map(sub, flat[2:], flat[:-2]))
+    text = format_batch("M" + "".join(parts)[1:] + "'", values, precision, ends=" lm'")
+    return text[:-1].replace(" -", "-")
+
+
+def paths(chains: Iterable[Sequence[tuple[float, float]]], precision: int) -> Iterator[str]:
+    """
+    Yield compound <path> elements for runs of points.
+
+    Runs are gathered into one element until it holds BATCH_SIZE segments,
+    so long drawings are still written a batch at a time.
+    """
+    batch: list[Sequence[tuple[float, float]]] = []
+    count = 0
+    for points in chains:
+        batch.append(points)
+        count += len(points) - 1
+        if count >= BATCH_SIZE:
+            yield f"<path d='{path_data(batch, precision)}'/>"
+            batch, count = [], 0
+    if batch:
+        yield f"<path d='{path_data(batch, precision)}'/>"
 
 
 def line(
-    start_xy: tuple[float, float], end_xy: tuple[float, float], addnl_styles: dict[str, Any] | None = None
+    start_xy: tuple[float, float], end_xy: tuple[float, float], addnl_styles: dict[str, Any] | None = None, precision: int | None = None
 ) -> str:
-    """return a line from start_xy to end_xy"""
+    """return a line from start_xy to end_xy, with coordinates formatted to precision if given"""
     styles = f" {dict_to_tags(addnl_styles)}" if addnl_styles else ""
+    if precision is not None:
+        start_xy = tuple(utils.set_precision(v, precision) for v in start_xy)
+        end_xy = tuple(utils.set_precision(v, precision) for v in end_xy)
+        return next(lines([(start_xy, end_xy, 0)], precision))[:-2] + f"{styles}/>"
     return f"<line x1='{start_xy[0]}' y1='{start_xy[1]}' x2='{end_xy[0]}' y2='{end_xy[1]}'{styles} />"
 
-def path(points: list[tuple[float, float]], addnl_styles: dict[str, Any] | None = None) -> str:
-    """return a path from a list of points"""
+def path(points: list[tuple[float, float]], addnl_styles: dict[str, Any] | None = None, precision: int | None = None) -> str:
+    """return a path from a list of points, as compact relative path data if precision is given"""
     if not points:
         return ""
     styles = f" {dict_to_tags(addnl_styles)}" if addnl_styles else ""
+    if precision is not None:
+        points = [(utils.set_precision(x, precision), utils.set_precision(y, precision)) for x, y in points]
+        return f"<path d='{path_data([points], precision)}'{styles}/>"
     d = f"M {points[0][0]} {points[0][1]} " + " ".join([f"L {p[0]} {p[1]}" for p in points[1:]])
     return f"<path d='{d}'{styles} />"
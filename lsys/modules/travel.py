@@ -0,0 +1,225 @@
+"""
+Pen plotter travel helpers
+"""
+
+from collections.abc import Sequence
+from math import floor, hypot, inf, sqrt
+from time import perf_counter
+
+Point = tuple[float, float]
+Line = tuple[Point, Point, float]
+
+
+def pen_up_distance(lines: Sequence[Line]) -> float:
+    """sum of the distances travelled between the end of one line and the start of the next"""
+    total = 0.0
+    for (_, end, _), (start, _, _) in zip(lines, lines[1:]):
+        total += hypot(start[0] - end[0], start[1] - end[1])
+    return total
+
+
+class SpatialHash:
+    """
+    Grid index over the end points of a list of lines.
+
+    Each cell holds (x, y, line index) entries. Lines are removed lazily:
+    discard() only marks them, and dead entries are pruned from a cell the
+    next time a query visits it, so a greedy tour pays for each line once.
+    """
+
+    __slots__ = ("cell_size", "cells", "live", "remaining")
+
+    def __init__(self, lines: Sequence[Line], cell_size: float | None = None) -> None:
+        self.cells: dict[tuple[int, int], list[tuple[float, float, int]]] = {}
+        self.live = [True] * len(lines)
+        self.remaining = len(lines)
+        if cell_size is None:
+            cell_size = self._default_cell_size(lines)
+        self.cell_size = cell_size
+        for i, (start, end, _) in enumerate(lines):
+            for x, y in (start, end):
+                self.cells.setdefault(self._key(x, y), []).append((x, y, i))
+
+    @staticmethod
+    def _default_cell_size(lines: Sequence[Line]) -> float:
+        """size cells so that there are about as many cells as lines"""
+        if not lines:
+            return 1.0
+        xs = [p[0] for line in lines for p in line[:2]]
+        ys = [p[1] for line in lines for p in line[:2]]
+        extent = max(max(xs) - min(xs), max(ys) - min(ys))
+        return extent / sqrt(len(lines)) if extent > 0 else 1.0
+
+    def _key(self, x: float, y: float) -> tuple[int, int]:
+        return floor(x / self.cell_size), floor(y / self.cell_size)
+
+    def discard(self, index: int) -> None:
+        """mark a line as used"""
+        if self.live[index]:
+            self.live[index] = False
+            self.remaining -= 1
+
+    def _closest_in(self, key: tuple[int, int], x: float, y: float, best: tuple[float, int | None]) -> tuple[float, int | None]:
+        entries = self.cells.get(key)
+        if entries is None:
+            return best
+        live = self.live
+        if not all(live[i] for _, _, i in entries):
+            entries = [entry for entry in entries if live[entry[2]]]
+            if entries:
+                self.cells[key] = entries
+            else:
+                del self.cells[key]
+                return best
+        best_dist, best_index = best
+        for px, py, i in entries:
+            dist = (px - x) ** 2 + (py - y) ** 2
+            # ties go to the lowest line index, as the original full scan did
+            if dist < best_dist or (dist == best_dist and i < best_index):
+                best_dist, best_index = dist, i
+        return best_dist, best_index
+
+    def nearest(self, point: Point) -> int | None:
+        """return the index of the live line with an end point closest to point"""
+        if not self.remaining:
+            return None
+        x, y = point
+        cx, cy = self._key(x, y)
+        best: tuple[float, int | None] = (inf, None)
+        ring = 0
+        while True:
+            if (2 * ring + 1) ** 2 > 4 * len(self.cells):
+                # the ring now covers more cells than are left: scan those instead
+                for key in list(self.cells):
+                    best = self._closest_in(key, x, y, best)
+                return best[1]
+            if ring == 0:
+                best = self._closest_in((cx, cy), x, y, best)
+            else:
+                for dx in range(-ring, ring + 1):
+                    best = self._closest_in((cx + dx, cy - ring), x, y, best)
+                    best = self._closest_in((cx + dx, cy + ring), x, y, best)
+                for dy in range(-ring + 1, ring):
+                    best = self._closest_in((cx - ring, cy + dy), x, y, best)
+                    best = self._closest_in((cx + ring, cy + dy), x, y, best)
+            # anything outside this ring is at least ring cells away
+            if best[1] is not None and best[0] < (ring * self.cell_size) ** 2:
+                return best[1]
+            ring += 1
+
+
+def split_chains(lines: Sequence[Line]) -> list[list[Line]]:
+    """split a tour into chains of lines drawn without lifting the pen"""
+    chains: list[list[Line]] = []
+    for line in lines:
+        if chains and chains[-1][-1][1] == line[0]:
+            chains[-1].append(line)
+        else:
+            chains.append([line])
+    return chains
+
+
+def reverse_chain(chain: list[Line]) -> list[Line]:
+    """return a chain drawn from its end back to its start"""
+    return [(end, start, weight) for start, end, weight in reversed(chain)]
+
+
+def refine_tour(lines: Sequence[Line], budget_seconds: float, window: int = 50) -> list[Line]:
+    """
+    Improves a tour's pen-up travel with 2-opt and Or-opt moves over its chains.
+
+    The tour is split into chains (see split_chains), which are reordered and
+    may be reversed, but never broken up. 2-opt reverses a run of chains,
+    and Or-opt moves a run of up to three chains elsewhere, reversed or not.
+    Moves are only tried between positions at most window apart. Passes
+    repeat until nothing improves or budget_seconds runs out.
+    """
+    chains = split_chains(lines)
+    count = len(chains)
+    if count < 3 or budget_seconds <= 0:
+        return list(lines)
+    deadline = perf_counter() + budget_seconds
+
+    chain_starts = [chain[0][0] for chain in chains]
+    chain_ends = [chain[-1][1] for chain in chains]
+    # position-indexed tour: which chain is drawn k-th, and whether it is reversed
+    order = list(range(count))
+    flipped = [False] * count
+
+    def start(k: int) -> Point:
+        return chain_ends[order[k]] if flipped[k] else chain_starts[order[k]]
+
+    def end(k: int) -> Point:
+        return chain_starts[order[k]] if flipped[k] else chain_ends[order[k]]
+
+    def gap(a: Point, b: Point) -> float:
+        return hypot(b[0] - a[0], b[1] - a[1])
+
+    def two_opt(i: int) -> bool:
+        """reverse positions i..j for the best j in the window"""
+        best_gain, best_j = 1e-9, None
+        before_i = gap(end(i - 1), start(i)) if i > 0 else 0.0
+        for j in range(i, min(count, i + window)):
+            old = before_i + (gap(end(j), start(j + 1)) if j + 1 < count else 0.0)
+            new = (gap(end(i - 1), end(j)) if i > 0 else 0.0) + (gap(start(i), start(j + 1)) if j + 1 < count else 0.0)
+            if old - new > best_gain:
+                best_gain, best_j = old - new, j
+        if best_j is None:
+            return False
+        order[i : best_j + 1] = order[i : best_j + 1][::-1]
+        flipped[i : best_j + 1] = [not f for f in flipped[i : best_j + 1][::-1]]
+        return True
+
+    def or_opt(i: int, length: int) -> bool:
+        """move positions i..i+length-1 to the best slot in the window"""
+        last = i + length - 1
+        if last >= count:
+            return False
+        seg_start, seg_end = start(i), end(last)
+        prev_end = end(i - 1) if i > 0 else None
+        next_start = start(last + 1) if last + 1 < count else None
+        removed = (gap(prev_end, seg_start) if prev_end else 0.0) + (gap(seg_end, next_start) if next_start else 0.0)
+        removed -= gap(prev_end, next_start) if prev_end and next_start else 0.0
+        best_gain, best = 1e-9, None
+        # slot p means "insert after position p" (-1 for the front)
+        for p in range(max(-1, i - window), min(count, last + window)):
+            if i - 1 <= p <= last:
+                continue
+            a = end(p) if p >= 0 else None
+            b = start(p + 1) if p + 1 < count else None
+            kept = gap(a, b) if a and b else 0.0
+            for reverse in (False, True):
+                first, final = (seg_end, seg_start) if reverse else (seg_start, seg_end)
+                added = (gap(a, first) if a else 0.0) + (gap(final, b) if b else 0.0) - kept
+                if removed - added > best_gain:
+                    best_gain, best = removed - added, (p, reverse)
+        if best is None:
+            return False
+        p, reverse = best
+        moved_order = order[i : last + 1]
+        moved_flipped = flipped[i : last + 1]
+        if reverse:
+            moved_order = moved_order[::-1]
+            moved_flipped = [not f for f in moved_flipped[::-1]]
+        del order[i : last + 1], flipped[i : last + 1]
+        slot = p + 1 if p < i else p + 1 - length
+        order[slot:slot] = moved_order
+        flipped[slot:slot] = moved_flipped
+        return True
+
+    improved = True
+    while improved and perf_counter() < deadline:
+        improved = False
+        for i in range(count):
+            if perf_counter() >= deadline:
+                break
+            if two_opt(i):
+                improved = True
+            for length in (1, 2, 3):
+                if or_opt(i, length):
+                    improved = True
+
+    refined: list[Line] = []
+    for chain_id, reverse in zip(order, flipped):
+        refined.extend(reverse_chain(chains[chain_id]) if reverse else chains[chain_id])
+    return refined
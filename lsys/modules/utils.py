@@ -7,9 +7,12 @@ General utility functions
 
 import os
 import datetime
+import logging
 from pathlib import Path
 from typing import Any
 
+from modules.log import LOGGER
+
 
 def create_dir(dir_path: Path | str) -> Path | str:
     """
@@ -26,51 +29,41 @@ def create_dir(dir_path: Path | str) -> Path | str:
 
 
 def print_params(param_dict: dict[str, Any]) -> None:
-    """print the parameters"""
-    if "TITLE" in param_dict:
-        # work out length of name
-        title = f"--- {param_dict['TITLE']} "
-        # print --- name  +  --- (68 - name_length) times
-        print(f"{title}{(68 - len(title)) * '-'}\n")
-    else:
-        print(f"{68 * '-'}\n")
+    """log the parameters, as one block"""
+    if not LOGGER.isEnabledFor(logging.INFO):
+        return
+    # work out length of name, and pad with --- to 68 characters
+    title = f"--- {param_dict['TITLE']} " if "TITLE" in param_dict else ""
+    lines = [f"{title}{(68 - len(title)) * '-'}\n".replace("%", "%%")]
+    values = []
     for key, value in param_dict.items():
         if key == "TITLE":
             continue
-        print(f"{key}: {value}")
-    print(f"\n{68 * '-'}")
-
-
-def calc_output_size(doc: list[str]) -> str:
-    """sum character counts in doc to get output size"""
-    length = 0
-    for element in doc:
-        length += len(element)
-    return human_values(length)
+        # values go in as arguments, so long rules and trees are truncated
+        lines.append(f"{key}: ".replace("%", "%%") + "%s")
+        values.append(value)
+    lines.append(f"\n{68 * '-'}")
+    LOGGER.info("\n".join(lines), *values)
 
 
 def human_values(integer: int | float) -> str:
-    """return a human readable value"""
-    bold = "\033[1m"
-    red = "\033[91m"
-    amber = "\033[93m"
-    green = "\033[92m"
-    normal = "\033[0m"
+    """return a human readable file size, logging it coloured by how large it is"""
     fs = "File size: "
     formats = [
-        (10000000, f"{bold}{red}{fs}{{:.2f}}M{normal}", 1000000),
-        (1000000, f"{bold}{amber}{fs}{{:.2f}}M{normal}", 1000000),
-        (1000, f"{bold}{green}{fs}{{:.2f}}k{normal}", 1000),
-        (-1, f"{bold}{green}{fs}{{:.0f}}b{normal}", 1),
+        (10000000, f"{fs}{{:.2f}}M", 1000000, "red"),
+        (1000000, f"{fs}{{:.2f}}M", 1000000, "amber"),
+        (1000, f"{fs}{{:.2f}}k", 1000, "green"),
+        (-1, f"{fs}{{:.0f}}b", 1, "green"),
     ]
 
-    for threshold, format_str, divisor in formats:
+    colour = None
+    for threshold, format_str, divisor, colour in formats:
         if integer > threshold:
             outstr = format_str.format(integer / divisor)
             break
     else:
         outstr = str(integer)
-    print(outstr)
+    LOGGER.info("%s", outstr, extra={"colour": colour, "fields": {"bytes": integer}})
     return outstr
 
 
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the modules are imported as lsys_main imports them, from the lsys directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
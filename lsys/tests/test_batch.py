@@ -0,0 +1,20 @@
+import subprocess
+import sys
+from pathlib import Path
+
+MAIN = Path(__file__).resolve().parent.parent / "lsys_main.py"
+
+
+def drawing(output_dir, pattern, *args):
+    """run lsys_main.py into output_dir, returning the svg matching pattern without its creation date"""
+    command = [sys.executable, str(MAIN), "--recursion", "5", "--output-dir", str(output_dir), *args]
+    subprocess.run(command, check=True, capture_output=True)
+    (svg,) = Path(output_dir).glob(pattern)
+    return [line for line in svg.read_text(encoding="utf-8").splitlines() if "CREATED" not in line]
+
+
+def test_single_run_matches_its_batch_drawing(tmp_path):
+    # batch drawing i is seeded with --seed + i, so drawing 2 of --seed 10 is --seed 12
+    single = drawing(tmp_path / "single", "*.svg", "--seed", "12")
+    batch = drawing(tmp_path / "batch", "*-0002.svg", "--batch", "3", "--workers", "1", "--seed", "10")
+    assert single == batch
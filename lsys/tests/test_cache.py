@@ -0,0 +1,39 @@
+import os
+
+from modules.cache import Cache
+from modules.segments import SegmentBuffer
+
+
+def test_key_ignores_dict_order_but_not_values():
+    assert Cache.key("F", {"A": "AB", "B": "A"}, 5) == Cache.key("F", {"B": "A", "A": "AB"}, 5)
+    assert Cache.key("F", {"A": "AB", "B": "A"}, 5) != Cache.key("F", {"A": "AB", "B": "A"}, 6)
+    assert Cache.key("F", 5, None) != Cache.key("F", 5, 100000)
+
+
+def test_entries_round_trip(tmp_path):
+    cache = Cache(tmp_path, 10**6)
+    lines = SegmentBuffer.from_lines([((0, 0), (1, 2), 3), ((1, 2), (4, 5), 3)])
+    cache.put_string("tree", "F+F-F")
+    cache.put_segments("tree", lines)
+    assert cache.get_string("tree") == "F+F-F"
+    assert list(cache.get_segments("tree")) == list(lines)
+    assert cache.get_string("missing") is None
+    assert cache.stats["hits"] == 2 and cache.stats["misses"] == 1
+
+
+def test_evict_drops_least_recently_used_and_spares_temp_files(tmp_path):
+    cache = Cache(tmp_path, 10**6)
+    for age, key in enumerate(["newest", "middle", "oldest"]):
+        cache.put_string(key, "F" * 1000)
+        os.utime(tmp_path / f"{key}.lsys", (1000 - age, 1000 - age))
+    temp = tmp_path / ".pending.lsys.123"
+    temp.write_bytes(b"x" * 10**4)
+
+    entry = (tmp_path / "newest.lsys").stat().st_size
+    cache.max_bytes = 2 * entry
+    cache.evict()
+    assert not (tmp_path / "oldest.lsys").exists()
+    assert (tmp_path / "middle.lsys").exists() and (tmp_path / "newest.lsys").exists()
+    assert temp.exists()
+    assert cache.size == 2 * entry
+    assert cache.stats["evictions"] == 1
@@ -0,0 +1,37 @@
+from modules.collinear import clip_overlaps, merge_collinear
+
+
+def test_merge_joins_overlapping_segments():
+    assert merge_collinear([((0, 0), (10, 0), 1), ((5, 0), (15, 0), 1)], 2) == [((0, 0), (15, 0), 1)]
+
+
+def test_merge_joins_touching_and_reversed_segments():
+    lines = [((10, 0), (0, 0), 1), ((10, 0), (20, 0), 1), ((20, 0), (30, 0), 1)]
+    assert merge_collinear(lines, 2) == [((0, 0), (30, 0), 1)]
+
+
+def test_merge_keeps_gaps_weights_and_parallel_lines_apart():
+    lines = [((0, 0), (10, 0), 1), ((11, 0), (20, 0), 1), ((0, 0), (10, 0), 2), ((0, 1), (10, 1), 1)]
+    assert sorted(merge_collinear(lines, 2)) == sorted(lines)
+
+
+def test_merge_joins_diagonal_overlaps():
+    assert merge_collinear([((0, 0), (2, 2), 1), ((1, 1), (3, 3), 1)], 2) == [((0, 0), (3, 3), 1)]
+
+
+def test_clip_cuts_overlaps_back():
+    kept, removed = clip_overlaps([((0, 0), (10, 0), 1), ((5, 0), (15, 0), 1)], 2)
+    assert kept == [((0, 0), (10, 0), 1), ((10, 0), (15, 0), 1)]
+    assert removed == 5
+
+
+def test_clip_drops_covered_segments_and_keeps_order():
+    lines = [((0, 0), (0, 5), 1), ((0, 0), (10, 0), 1), ((8, 0), (2, 0), 1)]
+    kept, removed = clip_overlaps(lines, 2)
+    assert kept == [((0, 0), (0, 5), 1), ((0, 0), (10, 0), 1)]
+    assert removed == 6
+
+
+def test_clip_leaves_touching_segments_alone():
+    lines = [((0, 0), (10, 0), 1), ((10, 0), (20, 0), 1)]
+    assert clip_overlaps(lines, 2) == (lines, 0)
@@ -0,0 +1,51 @@
+import random
+
+import pytest
+
+from bench.interpreter import EXTENDED, legacy_lsys_to_lines, same_segments
+from bench.rewrite import FERN, STOCHASTIC, legacy_rewrite
+from modules import lsys
+
+
+def test_rewrite_matches_the_original_engine():
+    for depth in range(9):
+        assert lsys.set_lsys_string("X", FERN, depth) == legacy_rewrite("X", FERN, depth)
+
+
+def test_stochastic_rewrite_matches_the_original_engine_for_a_seed():
+    for depth in range(6):
+        random.seed(depth)
+        expected = legacy_rewrite("Fx", STOCHASTIC, depth)
+        random.seed(depth)
+        assert lsys.set_lsys_string("Fx", STOCHASTIC, depth) == expected
+
+
+def test_rewrite_generation_never_rewrites_a_replacement():
+    assert lsys.rewrite_generation("AB", {"A": "B", "B": "A"}) == "BA"
+
+
+def test_f_and_g_runs_draw_separate_segments():
+    lines = lsys.lsys_to_lines("FG+F", 90, 10, 90)
+    assert len(lines) == 3
+    assert same_segments(lines, legacy_lsys_to_lines("FG+F", 90, 10, 90))
+
+
+def test_runs_of_one_symbol_draw_one_segment():
+    lines = lsys.lsys_to_lines("FFF", 0, 10, 90)
+    ((x1, y1), (x2, y2), _), = lines
+    assert (abs(x2 - x1), abs(y2 - y1)) == pytest.approx((30, 0), abs=1e-9)
+
+
+def test_matches_the_original_interpreter():
+    _, axiom, rules, n, angle, angle_offset, length = EXTENDED
+    string = lsys.set_lsys_string(axiom, rules, n)
+    expected = legacy_lsys_to_lines(string, angle, length, angle_offset)
+    assert same_segments(lsys.lsys_to_lines(string, angle, length, angle_offset), expected)
+
+
+def test_prediction_at_the_guard_depth_matches_the_expansion():
+    rules = {"F": "F+F-F-F+F"}
+    predicted = lsys.predict_lengths("F", rules, 12)
+    depth, message = lsys.guard_depth(predicted, 100000)
+    assert depth < 12 and message
+    assert len(lsys.set_lsys_string("F", rules, 12)) == predicted[depth][0]
@@ -0,0 +1,35 @@
+import pytest
+
+from modules import lsys, lsys_numpy
+
+np = pytest.importorskip("numpy")
+
+
+def test_snap_rounds_each_segment_on_its_own_scale():
+    segments = np.array(
+        [
+            [1e-14, -450.0, -1e-14, -325.0, 1.0],
+            [0.0, -450.0, 0.0, -325.0, 1.0],
+            [1e14, 0.0, 2e14, 0.0, 1.0],
+            [0.0, 0.0, 150.0, 0.0, 1.0],
+            [0.0, 0.0, 150.5, 0.0, 1.0],
+        ]
+    )
+    snapped = lsys_numpy.snap(segments)
+    # float noise on a segment's own scale is rounded away
+    assert (snapped[0] == snapped[1]).all()
+    # a far larger segment elsewhere doesn't coarsen the small ones
+    assert snapped[3:, 2].tolist() == [150.0, 150.5]
+
+
+def test_matches_python_backend_on_large_coordinates():
+    # lengths grow 1.2x a generation, so the drawing reaches about 1e12
+    tree = lsys.set_lsys_string("F", {"F": "F[|<#F))]F>|+&-"}, 8)
+    lines = lsys.lsys_to_lines(tree, 90, 150, 45)
+    segments = lsys_numpy.lsys_to_segments(tree, 90, 150, 45)
+    python = np.array([(*start, *end, weight) for start, end, weight in lines])
+    assert np.abs(python[:, :4]).max() > 1e12
+    assert len(segments) == len(python)
+    python = lsys_numpy.snap(python)
+    python, segments = (rows[np.lexsort(rows.T[::-1])] for rows in (python, segments))
+    assert np.allclose(segments, python, rtol=1e-9, atol=0)
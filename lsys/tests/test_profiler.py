@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+from modules.profiler import collapsed_stacks
+
+
+def layered_stats(layers, own=0.001):
+    """
+    pstats-like entries for main calling a0 and b0, where each function in
+    a layer calls both functions in the next: 2**layers distinct paths
+    """
+    entries = {}
+    below = 0.0
+    for layer in reversed(range(layers)):
+        cumulative = own + below
+        for name in "ab":
+            if layer:
+                callers = {("x.py", layer - 1, f"{caller}{layer - 1}"): (1, 1, own / 2, cumulative / 2) for caller in "ab"}
+            else:
+                callers = {("x.py", 0, "main"): (1, 1, own, cumulative)}
+            entries[("x.py", layer, f"{name}{layer}")] = (2, 2, own, cumulative, callers)
+        below = cumulative
+    entries[("x.py", 0, "main")] = (1, 1, own, own + 2 * below, {})
+    return SimpleNamespace(stats=entries), own + 2 * below
+
+
+def test_collapsed_stacks_keeps_paths_and_time():
+    stats, total = layered_stats(3)
+    lines = list(collapsed_stacks(stats))
+    assert len(lines) == 1 + 2 + 4 + 8
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == round(total * 1e6)
+
+
+def test_collapsed_stacks_caps_an_exponential_call_graph():
+    stats, total = layered_stats(40)
+    lines = list(collapsed_stacks(stats, max_stacks=500))
+    assert len(lines) <= 500
+    # the time below the cap is folded into the deepest frames reached
+    assert abs(sum(int(line.rsplit(" ", 1)[1]) for line in lines) - round(total * 1e6)) <= len(lines)
@@ -0,0 +1,37 @@
+from modules.segments import BLOCK, SegmentBuffer
+
+
+def test_normalise_orients_each_segment_start_first():
+    lines = SegmentBuffer.from_lines([((5, 0), (0, 0), 1), ((0, 5), (0, 0), 2), ((1, 1), (2, 2), 3)])
+    lines.normalise()
+    assert list(lines) == [((0, 0), (5, 0), 1), ((0, 0), (0, 5), 2), ((1, 1), (2, 2), 3)]
+
+
+def test_dedupe_keeps_first_of_each_segment():
+    lines = SegmentBuffer.from_lines(
+        [((0, 0), (1, 0), 1), ((0, 0), (0, 1), 1), ((0, 0), (1, 0), 1), ((0, 0), (1, 0), 2)]
+    )
+    lines.dedupe()
+    assert list(lines) == [((0, 0), (1, 0), 1), ((0, 0), (0, 1), 1), ((0, 0), (1, 0), 2)]
+
+
+def test_reversed_duplicates_only_match_after_normalise():
+    lines = SegmentBuffer.from_lines([((0, 0), (3, 4), 1), ((3, 4), (0, 0), 1)])
+    lines.dedupe()
+    assert len(lines) == 2
+    lines.normalise()
+    lines.dedupe()
+    assert list(lines) == [((0, 0), (3, 4), 1)]
+
+
+def test_round_makes_negative_zero_dedupe_with_zero():
+    lines = SegmentBuffer.from_lines([((-0.0001, 0), (1, 0), 1), ((0, 0), (1, 0), 1)])
+    lines.round(2)
+    lines.dedupe()
+    assert list(lines) == [((0, 0), (1, 0), 1)]
+
+
+def test_bounds_spans_blocks_without_a_tracked_box():
+    lines = SegmentBuffer.from_lines([((i, -i), (i + 0.5, 2 * i), 1) for i in range(BLOCK + 10)])
+    assert lines.box is None
+    assert lines.bounds() == (0, -(BLOCK + 9), BLOCK + 9.5, 2 * (BLOCK + 9))
@@ -0,0 +1,39 @@
+import re
+
+from modules.svg import path_data
+
+
+def parse_path(data):
+    """the runs of absolute points in path data with M, m and l commands"""
+    chains = []
+    x = y = 0.0
+    for command, numbers in re.findall(r"([Mml])([^Mml]*)", data):
+        values = [float(value) for value in re.findall(r"-?\d*\.?\d+", numbers)]
+        pairs = list(zip(values[::2], values[1::2]))
+        if command == "l":
+            for dx, dy in pairs:
+                x, y = x + dx, y + dy
+                chains[-1].append((x, y))
+            continue
+        (dx, dy), = pairs
+        x, y = (dx, dy) if command == "M" else (x + dx, y + dy)
+        chains.append([(x, y)])
+    return chains
+
+
+def test_path_data_is_compact():
+    assert path_data([[(10, 20), (15, 15), (15, 25)], [(35, 25), (40, 30)]], 0) == "M10 20l5-5 0 10m20 0l5 5"
+
+
+def test_path_data_round_trips():
+    chains = [
+        [(1.25, -3.5), (4.75, 2.0), (0.5, 0.5)],
+        [(-10.0, 7.25)],
+        [(3.0, 3.0), (-2.5, -8.75)],
+    ]
+    parsed = parse_path(path_data(chains, 2))
+    assert [[(round(x, 2), round(y, 2)) for x, y in chain] for chain in parsed] == chains
+
+
+def test_path_data_of_nothing_is_empty():
+    assert path_data([], 2) == ""